@@ -0,0 +1,76 @@
+import headless
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_SIZES = [4, 100, 1000, 10000]
+
+def bench(villagers: int, obstacles: int, backend: str, steps: int, seed: int, draw: bool, spread: bool = False) -> dict:
+    game = headless.make_game(villagers, obstacles, seed, backend, spread=spread)
+    # One warm-up tick builds lazy state (numpy arrays, caches) outside the timed run.
+    headless.run(game, 1, draw=draw)
+    result = headless.run(game, steps, draw=draw)
+    game.shutdown()
+    result.update({
+        "backend": backend,
+        "villagers": len(game.villagers),
+        "obstacles": len(game.obstacles),
+        "scheduler": game.scheduler.stats()
+    })
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how the village simulation scales with population.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--backends", nargs="+", choices=["python", "numpy"],
+                        default=["python", "numpy"] if numpy else ["python"])
+    parser.add_argument("--obstacles", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-draw", action="store_true")
+    parser.add_argument("--spread", action="store_true", help="scatter villagers over the whole world, mostly off screen")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    
+    results = []
+    for backend in args.backends:
+        for size in args.sizes:
+            result = bench(size, args.obstacles, backend, args.steps, args.seed, not args.no_draw, args.spread)
+            results.append(result)
+            phases = result["phase_ms"]
+            print(
+                f"{backend:>6} {result['villagers']:>6} villagers: {result['ticks_per_sec']:9.1f} ticks/s "
+                f"(events {phases['events']:.3f} ms, update {phases['update']:.3f} ms, draw {phases['draw']:.3f} ms)",
+                file=sys.stderr
+            )
+            
+    report = {
+        "version": 1,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "numpy": numpy.__version__ if numpy else None,
+        "steps": args.steps,
+        "seed": args.seed,
+        "draw": not args.no_draw,
+        "spread": args.spread,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
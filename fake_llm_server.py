@@ -0,0 +1,239 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "well the bread is fresh today and the oven is still warm so come inside friend I have not seen you around "
+    "here before the harvest looks good this year but the old mill needs fixing before the rains arrive"
+).split()
+
+class FakeLLMConfig:
+    def __init__(self, latency: float = 0.2, latency_jitter: float = 0.0, distribution: str = "fixed",
+                 tokens_per_sec: float = 30.0, reply_tokens: int = 40, error_rate: float = 0.0,
+                 error_status: int = 503, timeout_rate: float = 0.0, hang_seconds: float = 30.0, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.distribution = distribution
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+        
+    def sample_latency(self, rng: random.Random) -> float:
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(self.latency - self.latency_jitter, self.latency + self.latency_jitter))
+        if self.distribution == "lognormal":
+            # `latency` is the median and `latency_jitter` the sigma of the underlying normal,
+            # which gives the long right tail real model servers show under load.
+            return self.latency * rng.lognormvariate(0.0, self.latency_jitter) if self.latency else 0.0
+        return self.latency
+        
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (timeouts, pool shutdown) are expected here.
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+class FakeLLMServer:
+    # Speaks just enough of the OpenAI /v1/chat/completions API for
+    # LMStudioAPI: JSON replies, SSE streaming, injected errors and hangs.
+    def __init__(self, config: FakeLLMConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeLLMConfig()
+        self.rng = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.server_times = deque(maxlen=10000)
+        self.counters = {
+            "requests": 0,
+            "streamed": 0,
+            "completed": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "disconnects": 0,
+            "bad_requests": 0
+        }
+        self.httpd = QuietHTTPServer((host, port), self._handler_class())
+        self.thread = None
+        
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+        
+    def _handler_class(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+                
+            def do_GET(self):
+                if self.path.rstrip("/") == "/v1/models":
+                    self.send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+                else:
+                    self.send_json(404, {"error": {"message": "not found"}})
+                    
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self.send_json(404, {"error": {"message": "not found"}})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    messages = body["messages"]
+                except (ValueError, KeyError, TypeError):
+                    server.count("bad_requests")
+                    self.send_json(400, {"error": {"message": "invalid request body"}})
+                    return
+                server.handle(self, body, messages)
+                
+            def send_json(self, status: int, payload: dict):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                
+            def write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+                
+        return Handler
+        
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+            
+    def _plan(self):
+        # Decided under the lock so a seeded server gives the same outcomes on every run.
+        config = self.config
+        with self.lock:
+            self.counters["requests"] += 1
+            roll = self.rng.random()
+            latency = config.sample_latency(self.rng)
+            start = self.rng.randrange(len(WORDS))
+        if roll < config.timeout_rate:
+            return "timeout", latency, start
+        if roll < config.timeout_rate + config.error_rate:
+            return "error", latency, start
+        return "ok", latency, start
+        
+    def handle(self, handler, body: dict, messages: list):
+        started = time.perf_counter()
+        outcome, latency, start = self._plan()
+        config = self.config
+        if outcome == "timeout":
+            self.count("timeouts")
+            time.sleep(config.hang_seconds)
+            handler.close_connection = True
+            return
+        time.sleep(latency)
+        if outcome == "error":
+            self.count("errors")
+            handler.send_json(config.error_status, {"error": {"message": "injected failure"}})
+            return
+            
+        words = [WORDS[(start + i) % len(WORDS)] for i in range(config.reply_tokens)]
+        token_delay = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+        try:
+            if body.get("stream"):
+                self.count("streamed")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/event-stream")
+                handler.send_header("Transfer-Encoding", "chunked")
+                handler.end_headers()
+                for i, word in enumerate(words):
+                    if i and token_delay:
+                        time.sleep(token_delay)
+                    chunk = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+                    handler.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                handler.write_chunk(b"data: [DONE]\n\n")
+                handler.write_chunk(b"")
+            else:
+                time.sleep(token_delay * len(words))
+                handler.send_json(200, {
+                    "object": "chat.completion",
+                    "model": body.get("model", "fake-model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                                 "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in messages),
+                        "completion_tokens": len(words)
+                    }
+                })
+        except (BrokenPipeError, ConnectionResetError):
+            self.count("disconnects")
+            handler.close_connection = True
+            return
+        with self.lock:
+            self.counters["completed"] += 1
+            self.server_times.append(time.perf_counter() - started)
+            
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counters)
+            
+    def start(self) -> "FakeLLMServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm-server", daemon=True)
+        self.thread.start()
+        return self
+        
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--server-seed", type=int)
+
+def config_from_args(args) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        distribution=args.distribution,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.server_seed
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    
+    server = FakeLLMServer(config_from_args(args), args.host, args.port)
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
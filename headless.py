@@ -0,0 +1,140 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import random
+import time
+from collections import defaultdict
+
+import pygame
+
+import main
+from main import Game, Tree, Villager, SCREEN_WIDTH, SCREEN_HEIGHT, WORLD_WIDTH, WORLD_HEIGHT
+
+class StubLLM:
+    def __init__(self, reply: str = "Hello there, traveller!", delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+        
+    def get_response(self, prompt: str, character_context: str = "") -> str:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.reply
+        
+    def stream_response(self, prompt: str, character_context: str = ""):
+        self.calls += 1
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                time.sleep(self.delay / len(words))
+            yield word if i == 0 else " " + word
+
+class InputScript:
+    def __init__(self):
+        self.presses = defaultdict(list)
+        self.holds = []
+        
+    def press(self, tick: int, key: int, unicode: str = ""):
+        self.presses[tick].append(pygame.event.Event(pygame.KEYDOWN, key=key, unicode=unicode, mod=0, scancode=0))
+        return self
+        
+    def type_text(self, tick: int, text: str):
+        for i, char in enumerate(text):
+            self.press(tick + i, ord(char.lower()), char)
+        return self
+        
+    def hold(self, start: int, end: int, key: int):
+        self.holds.append((start, end, key))
+        return self
+        
+    def events_at(self, tick: int) -> list:
+        return self.presses.get(tick, [])
+        
+    def keys_at(self, tick: int):
+        keys = defaultdict(bool)
+        for start, end, key in self.holds:
+            if start <= tick < end:
+                keys[key] = True
+        return keys
+
+def free_position(game, rng, width, height, attempts=50, area=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+    for _ in range(attempts):
+        x = rng.randint(0, area[0] - width)
+        y = rng.randint(0, area[1] - height)
+        if not game.obstacle_index.collides(pygame.Rect(x, y, width, height)):
+            return x, y
+    return None
+
+def populate(game, villagers: int, obstacles: int, seed: int = 0, spread: bool = False):
+    # `spread` scatters everything over the whole world instead of the first screen.
+    rng = random.Random(seed)
+    area = (WORLD_WIDTH, WORLD_HEIGHT) if spread else (SCREEN_WIDTH, SCREEN_HEIGHT)
+    while len(game.obstacles) < obstacles:
+        position = free_position(game, rng, 40, 60, area=area)
+        if position is None:
+            break
+        game.add_tree(Tree(*position))
+    while len(game.villagers) < villagers:
+        position = free_position(game, rng, 32, 32, area=area)
+        if position is None:
+            break
+        index = len(game.villagers)
+        game.add_villager(Villager(*position, f"Villager {index}", f"You are Villager {index}, a quiet resident of the village."))
+
+def make_game(villagers: int = 4, obstacles: int = 8, seed: int = 0, sim_backend: str = main.SIM_BACKEND, llm=None,
+              procedural: bool = False, save_path=None, spread: bool = False):
+    # The generated outskirts are off by default so population sizes are exactly what was asked for,
+    # and nothing is loaded from or autosaved to the player's save file.
+    random.seed(seed)
+    game = Game(ai_api=llm or StubLLM(), sim_backend=sim_backend, procedural=procedural, save_path=save_path)
+    populate(game, villagers, obstacles, seed, spread)
+    return game
+
+def run(game, steps: int, script: InputScript = None, draw: bool = True) -> dict:
+    script = script or InputScript()
+    phases = {"events": 0.0, "update": 0.0, "draw": 0.0}
+    clock = time.perf_counter
+    started = clock()
+    for tick in range(steps):
+        t0 = clock()
+        game.llm_pipeline.poll()
+        pygame.event.pump()
+        game.handle_events(script.events_at(tick))
+        t1 = clock()
+        game.update(script.keys_at(tick))
+        t2 = clock()
+        if draw:
+            game.draw()
+            game.present()
+        t3 = clock()
+        phases["events"] += t1 - t0
+        phases["update"] += t2 - t1
+        phases["draw"] += t3 - t2
+    elapsed = clock() - started
+    return {
+        "steps": steps,
+        "seconds": elapsed,
+        "ticks_per_sec": steps / elapsed if elapsed else 0.0,
+        "phase_ms": {name: total * 1000 / steps for name, total in phases.items()}
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the village simulation without a window.")
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--villagers", type=int, default=4)
+    parser.add_argument("--obstacles", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["python", "numpy"], default=main.SIM_BACKEND)
+    parser.add_argument("--no-draw", action="store_true")
+    parser.add_argument("--spread", action="store_true", help="scatter villagers over the whole world")
+    args = parser.parse_args()
+    
+    game = make_game(args.villagers, args.obstacles, args.seed, args.backend, spread=args.spread)
+    result = run(game, args.steps, draw=not args.no_draw)
+    game.shutdown()
+    print(json.dumps(result, indent=2))
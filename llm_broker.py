@@ -0,0 +1,262 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from llm_pipeline import LLMPipeline, LLMRequest
+
+PRIORITY_PLAYER, PRIORITY_EVENT, PRIORITY_SPECULATIVE, PRIORITY_AMBIENT = range(4)
+PRIORITY_NAMES = ["player", "event", "speculative", "ambient"]
+
+BATCH_INSTRUCTIONS = (
+    "You are voicing several villagers in a game at once. Answer every numbered item with exactly one line "
+    "that starts with its number, spoken in character by that villager. Keep each line to one short sentence."
+)
+BATCH_LINE = re.compile(r"^\s*(\d+)\s*[.):]\s*(.+)$")
+
+class LLMBroker(LLMPipeline):
+    # Schedules requests by priority class on top of the pipeline's workers.
+    # Player dialog always runs first and at most `background_slots` workers
+    # ever serve event reactions and ambient chatter, so there is always a
+    # worker free for the player no matter how much background work is queued.
+    def __init__(self, api, max_workers: int = 4, background_slots: int = 1, max_queue: int = 16,
+                 max_batch: int = 4, preempt: bool = True, on_complete: Optional[Callable] = None):
+        self.queues = [deque() for _ in PRIORITY_NAMES]
+        self.coalescing = {}
+        self.active = [0] * len(PRIORITY_NAMES)
+        self.running = set()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.background_slots = max(1, min(background_slots, max_workers - 1))
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.preempt = preempt
+        self.counters = {
+            "submitted": 0,
+            "coalesced": 0,
+            "batches": 0,
+            "batched": 0,
+            "expired": 0,
+            "shed": 0,
+            "rejected": 0,
+            "preempted": 0
+        }
+        super().__init__(api, max_workers, on_complete)
+        
+    def submit(self, prompt: str, context: str = "", on_done: Optional[Callable] = None, villager=None,
+               stream: bool = False, on_token: Optional[Callable] = None, priority: int = PRIORITY_PLAYER,
+               coalesce_key=None, batch_key=None, deadline: Optional[float] = None) -> Optional[LLMRequest]:
+        request = LLMRequest(prompt, context, on_done, villager, stream, on_token)
+        request.priority = priority
+        request.coalesce_key = coalesce_key
+        request.batch_key = batch_key
+        if deadline is not None:
+            request.deadline = request.submitted_at + deadline
+            
+        with self.condition:
+            self.counters["submitted"] += 1
+            if priority == PRIORITY_PLAYER:
+                if self.preempt:
+                    self._preempt_ambient()
+            else:
+                # A newer request for the same thing replaces one still waiting in the queue.
+                previous = self.coalescing.get(coalesce_key) if coalesce_key is not None else None
+                if previous is not None and previous.pending:
+                    previous.cancel()
+                    self.counters["coalesced"] += 1
+                if self.background_queued() >= self.max_queue and not self._shed(priority):
+                    self.counters["rejected"] += 1
+                    return None
+                    
+            self._track(request)
+            self.queues[priority].append(request)
+            if coalesce_key is not None:
+                self.coalescing[coalesce_key] = request
+            self.condition.notify()
+        return request
+        
+    def background_queued(self) -> int:
+        # Workers pop from the queues under the lock, so count under it too
+        # (the lock is reentrant, and submit already holds it).
+        with self.condition:
+            return sum(1 for queue in self.queues[PRIORITY_EVENT:] for request in queue if request.pending)
+            
+    @property
+    def pressure(self) -> float:
+        # 0.0 when the background queue is empty, 1.0 when new requests start being shed.
+        return self.background_queued() / self.max_queue if self.max_queue else 1.0
+        
+    def _shed(self, priority: int) -> bool:
+        # Make room by dropping the oldest request of the least important class
+        # that is no more important than the newcomer.
+        for level in range(len(self.queues) - 1, priority - 1, -1):
+            for queued in self.queues[level]:
+                if queued.pending:
+                    queued.drop()
+                    self.counters["shed"] += 1
+                    return True
+        return False
+        
+    def promote(self, request: LLMRequest):
+        # Someone is now waiting on a background request (a speculative
+        # greeting the player has walked up to): run it as player dialog, with
+        # no deadline, ahead of the rest of the background queue.
+        with self.condition:
+            request.deadline = None
+            if request.priority == PRIORITY_PLAYER or not request.pending:
+                return
+            queue = self.queues[request.priority]
+            if request not in queue:
+                # Already running; it keeps its worker but finishes as player dialog.
+                request.priority = PRIORITY_PLAYER
+                return
+            queue.remove(request)
+            self._release(request)
+            request.priority = PRIORITY_PLAYER
+            request.batch_key = None
+            if self.preempt:
+                self._preempt_ambient()
+            self.queues[PRIORITY_PLAYER].append(request)
+            self.condition.notify()
+            
+    def _preempt_ambient(self):
+        # Running background calls are streamed, so cancelling one closes its
+        # connection and frees the model for the player straight away.
+        for request in self.running:
+            if request.priority == PRIORITY_AMBIENT and not request.cancelled:
+                request.cancel()
+                self.counters["preempted"] += 1
+                
+    def _release(self, request: LLMRequest):
+        if request.coalesce_key is not None and self.coalescing.get(request.coalesce_key) is request:
+            del self.coalescing[request.coalesce_key]
+            
+    def _usable(self, request: LLMRequest, now: float) -> bool:
+        if not request.pending:
+            return False
+        if request.deadline is not None and now > request.deadline:
+            request.drop()
+            self.counters["expired"] += 1
+            return False
+        return True
+        
+    def _next_batch(self) -> Optional[List[LLMRequest]]:
+        now = time.perf_counter()
+        for priority, queue in enumerate(self.queues):
+            if priority != PRIORITY_PLAYER and sum(self.active[PRIORITY_EVENT:]) >= self.background_slots:
+                return None
+            while queue:
+                request = queue.popleft()
+                self._release(request)
+                if not self._usable(request, now):
+                    continue
+                batch = [request]
+                if request.batch_key is not None:
+                    for other in list(queue):
+                        if len(batch) >= self.max_batch:
+                            break
+                        if other.batch_key == request.batch_key:
+                            queue.remove(other)
+                            self._release(other)
+                            if self._usable(other, now):
+                                batch.append(other)
+                return batch
+        return None
+        
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                batch = self._next_batch()
+                while batch is None:
+                    if self.closed:
+                        return
+                    self.condition.wait()
+                    batch = self._next_batch()
+                priority = batch[0].priority
+                self.active[priority] += 1
+                self.running.update(batch)
+                if len(batch) > 1:
+                    self.counters["batches"] += 1
+                    self.counters["batched"] += len(batch)
+                    
+            try:
+                if priority == PRIORITY_PLAYER:
+                    self._execute(batch[0])
+                else:
+                    self._execute_batch(batch)
+            finally:
+                with self.condition:
+                    self.active[priority] -= 1
+                    self.running.difference_update(batch)
+                    self.condition.notify_all()
+                    
+    def _execute_batch(self, batch: List[LLMRequest]):
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        for request in batch:
+            request.started_at = started
+        prompt, context = self.combine(batch)
+        # A lone streaming request gets its tokens as they arrive, like player dialog.
+        streaming = batch[0] if len(batch) == 1 and batch[0].stream else None
+        try:
+            tokens = []
+            stream = self.api.stream_response(prompt, context)
+            try:
+                for token in stream:
+                    if all(request.cancelled for request in batch):
+                        break
+                    if batch[0].first_word_at is None and token.strip():
+                        first_word = time.perf_counter()
+                        for request in batch:
+                            request.first_word_at = first_word
+                    tokens.append(token)
+                    if streaming is not None:
+                        self.completed.put((streaming, token))
+                else:
+                    for request in batch:
+                        request.complete = True
+            finally:
+                stream.close()
+            results = self.split("".join(tokens).strip(), batch)
+        except Exception as e:
+            for request in batch:
+                request.finished_at = time.perf_counter()
+                request.future.set_exception(e)
+        else:
+            for request, result in zip(batch, results):
+                request.finished_at = time.perf_counter()
+                request.future.set_result(result)
+                
+    def combine(self, batch: List[LLMRequest]):
+        if len(batch) == 1:
+            return batch[0].prompt, batch[0].context
+        items = [f"{i}. {request.context}\nSituation: {request.prompt}" for i, request in enumerate(batch, 1)]
+        return "\n\n".join(items), BATCH_INSTRUCTIONS
+        
+    def split(self, text: str, batch: List[LLMRequest]) -> List[Optional[str]]:
+        if len(batch) == 1:
+            return [text]
+        answers = {}
+        for line in text.splitlines():
+            match = BATCH_LINE.match(line)
+            if match:
+                answers.setdefault(int(match.group(1)), match.group(2).strip())
+        return [answers.get(i) for i in range(1, len(batch) + 1)]
+        
+    def stats(self) -> dict:
+        with self.condition:
+            stats = dict(self.counters)
+            for priority, name in enumerate(PRIORITY_NAMES):
+                stats[f"queued_{name}"] = sum(1 for request in self.queues[priority] if request.pending)
+                stats[f"active_{name}"] = self.active[priority]
+            stats["queued_background"] = self.background_queued()
+        return stats
+        
+    def shutdown(self):
+        with self.condition:
+            self.closed = True
+            self.cancel_all()
+            self.condition.notify_all()
@@ -0,0 +1,257 @@
+import headless
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from main import (
+    LMStudioAPI, Villager, FPS, LLM_WORKERS, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_RETRIES,
+    LLM_BACKGROUND_SLOTS, LLM_BACKGROUND_QUEUE, LLM_BATCH_SIZE, LLM_CHATTER_DEADLINE
+)
+from fake_llm_server import FakeLLMServer, add_config_arguments, config_from_args
+from llm_broker import LLMBroker, PRIORITY_AMBIENT
+from llm_transport import HTTPTransport
+
+PLAYER_LINES = [
+    "Hello there!",
+    "How is the bread today?",
+    "Have you seen the old mill?",
+    "What do you think of the weather?",
+    "Any news from the village?",
+    "Tell me about yourself."
+]
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+        
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1] * 1000
+    }
+
+class Conversation:
+    def __init__(self, villager: Villager, turns: int):
+        self.villager = villager
+        self.turns_left = turns
+        self.next_at = 0.0
+        self.request = None
+
+def run_load(url: str, conversations: int = 50, turns: int = 4, workers: int = LLM_WORKERS,
+             stream: bool = True, think_time: float = 0.5, ambient_rate: float = 0.0, frame_rate: int = FPS,
+             max_seconds: float = 300.0, seed: int = 0, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+             read_timeout: float = LLM_READ_TIMEOUT, max_retries: int = LLM_MAX_RETRIES) -> dict:
+    rng = random.Random(seed)
+    transport = HTTPTransport(
+        pool_size=workers,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_retries=max_retries
+    )
+    api = LMStudioAPI(url, transport)
+    broker = LLMBroker(
+        api,
+        max_workers=workers,
+        background_slots=LLM_BACKGROUND_SLOTS,
+        max_queue=LLM_BACKGROUND_QUEUE,
+        max_batch=LLM_BATCH_SIZE
+    )
+    talks = [
+        Conversation(Villager(0, 0, f"Villager {i}", f"You are Villager {i}, a quiet resident of the village."), turns)
+        for i in range(conversations)
+    ]
+    latencies = []
+    queue_waits = []
+    service_times = []
+    ttfw = []
+    ambient_latencies = []
+    poll_times = []
+    totals = {"requests": 0, "failures": 0, "tokens": 0, "ambient_requests": 0, "ambient_dropped": 0}
+    
+    def on_token(request, token):
+        totals["tokens"] += 1
+        
+    def on_done(request):
+        talk = request.villager
+        talk.request = None
+        talk.next_at = time.perf_counter() + think_time * rng.uniform(0.5, 1.5)
+        if request.result is None or LMStudioAPI.is_fallback(request.result):
+            totals["failures"] += 1
+            return
+        latencies.append(request.finished_at - request.submitted_at)
+        queue_waits.append(request.started_at - request.submitted_at)
+        service_times.append(request.finished_at - request.started_at)
+        if request.time_to_first_word is not None:
+            ttfw.append(request.time_to_first_word)
+        talk.villager.add_memory(f"Said: {request.result}")
+        
+    def on_ambient(request):
+        if request.result is not None:
+            ambient_latencies.append(request.finished_at - request.submitted_at)
+            
+    frame = 1.0 / frame_rate
+    next_ambient = 0.0
+    started = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now - started > max_seconds:
+            break
+        active = False
+        for talk in talks:
+            if talk.request is not None:
+                active = True
+            elif talk.turns_left and now >= talk.next_at:
+                line = rng.choice(PLAYER_LINES)
+                talk.villager.add_memory(f"Player said: {line}")
+                talk.request = broker.submit(
+                    line,
+                    talk.villager.get_context(line),
+                    on_done=on_done,
+                    villager=talk,
+                    stream=stream,
+                    on_token=on_token
+                )
+                talk.turns_left -= 1
+                totals["requests"] += 1
+                active = True
+            elif talk.turns_left:
+                active = True
+        if not active:
+            break
+        if ambient_rate and now >= next_ambient:
+            next_ambient = now + 1.0 / ambient_rate
+            speaker = rng.choice(talks).villager
+            request = broker.submit(
+                "You run into a neighbour. Say one short line to them.",
+                speaker.get_context(),
+                on_done=on_ambient,
+                priority=PRIORITY_AMBIENT,
+                batch_key="chatter",
+                deadline=LLM_CHATTER_DEADLINE
+            )
+            totals["ambient_requests"] += 1
+            if request is None:
+                totals["ambient_dropped"] += 1
+                
+        poll_started = time.perf_counter()
+        broker.poll()
+        poll_times.append(time.perf_counter() - poll_started)
+        time.sleep(max(0.0, frame - (time.perf_counter() - now)))
+        
+    elapsed = time.perf_counter() - started
+    broker.shutdown()
+    transport_stats = transport.stats()
+    transport.close()
+    completed = len(latencies)
+    return {
+        "url": url,
+        "conversations": conversations,
+        "turns": turns,
+        "workers": workers,
+        "stream": stream,
+        "ambient_rate": ambient_rate,
+        "seconds": elapsed,
+        "requests": totals["requests"],
+        "completed": completed,
+        "failures": totals["failures"],
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "tokens_per_sec": totals["tokens"] / elapsed if elapsed else 0.0,
+        "latency": percentiles(latencies),
+        "queue_wait": percentiles(queue_waits),
+        "service": percentiles(service_times),
+        "time_to_first_word": percentiles(ttfw),
+        "ambient_latency": percentiles(ambient_latencies),
+        "ambient_requests": totals["ambient_requests"],
+        "ambient_dropped": totals["ambient_dropped"],
+        "poll": percentiles(poll_times),
+        "broker": broker.stats(),
+        "transport": transport_stats
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive simulated villager conversations against an LLM server.")
+    parser.add_argument("--url", help="target server; by default a fake server is started in-process")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=LLM_WORKERS)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--ambient-rate", type=float, default=0.0, help="background chatter requests per second")
+    parser.add_argument("--max-seconds", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--connect-timeout", type=float, default=LLM_CONNECT_TIMEOUT)
+    parser.add_argument("--read-timeout", type=float, default=LLM_READ_TIMEOUT)
+    parser.add_argument("--max-retries", type=int, default=LLM_MAX_RETRIES)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    server = None
+    url = args.url
+    if not url:
+        server = FakeLLMServer(config_from_args(args)).start()
+        url = server.url
+    try:
+        result = run_load(
+            url,
+            conversations=args.conversations,
+            turns=args.turns,
+            workers=args.workers,
+            stream=not args.no_stream,
+            think_time=args.think_time,
+            ambient_rate=args.ambient_rate,
+            max_seconds=args.max_seconds,
+            seed=args.seed,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            max_retries=args.max_retries
+        )
+    finally:
+        if server:
+            server.stop()
+            
+    if server:
+        # Whatever a worker spends on a request beyond the server's own handling
+        # time (connection setup, parsing, thread handoff) is client-side overhead.
+        server_times = percentiles(list(server.server_times))
+        result["server"] = dict(server.stats(), config=server.config.to_dict(), handling=server_times)
+        if server_times["count"] and result["service"]["count"]:
+            result["client_overhead_ms"] = {
+                "mean": result["service"]["mean_ms"] - server_times["mean_ms"],
+                "p50": result["service"]["p50_ms"] - server_times["p50_ms"]
+            }
+            
+    latency = result["latency"]
+    print(
+        f"{result['completed']}/{result['requests']} replies in {result['seconds']:.1f}s "
+        f"({result['throughput_rps']:.1f} req/s, {result['failures']} failed), latency p50 "
+        f"{latency.get('p50_ms', 0):.0f} ms p99 {latency.get('p99_ms', 0):.0f} ms, "
+        f"poll p99 {result['poll'].get('p99_ms', 0):.3f} ms",
+        file=sys.stderr
+    )
+    
+    report = {
+        "version": 1,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "result": result
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
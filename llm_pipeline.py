@@ -0,0 +1,174 @@
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+class LLMRequest:
+    def __init__(self, prompt: str, context: str, on_done: Optional[Callable] = None, villager=None,
+                 stream: bool = False, on_token: Optional[Callable] = None):
+        self.prompt = prompt
+        self.context = context
+        self.on_done = on_done
+        self.on_token = on_token
+        self.villager = villager
+        self.stream = stream
+        self.cache_key = None
+        self.priority = 0
+        self.coalesce_key = None
+        self.batch_key = None
+        self.deadline = None
+        self.future = Future()
+        self.cancelled = False
+        # Cancelled by the scheduler (expired or shed) rather than by whoever
+        # submitted it, who is still waiting to hear back.
+        self.dropped = False
+        # Set once the reply has been read to its end, not cut short by a cancel.
+        self.complete = False
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.first_word_at = None
+        self.finished_at = None
+        
+    def cancel(self):
+        self.cancelled = True
+        self.future.cancel()
+        
+    def drop(self):
+        self.dropped = True
+        self.cancel()
+        
+    @property
+    def pending(self) -> bool:
+        return not self.cancelled and not self.future.done()
+        
+    @property
+    def result(self) -> Optional[str]:
+        if self.future.done() and not self.future.cancelled() and self.future.exception() is None:
+            return self.future.result()
+        return None
+        
+    @property
+    def time_to_first_word(self) -> Optional[float]:
+        if self.first_word_at is None:
+            return None
+        return self.first_word_at - self.submitted_at
+
+class LLMPipeline:
+    def __init__(self, api, max_workers: int = 4, on_complete: Optional[Callable] = None):
+        self.api = api
+        # Called on the main thread for every finished request, whoever submitted it.
+        self.on_complete = on_complete
+        self.jobs = queue.Queue()
+        self.completed = queue.Queue()
+        self.in_flight = set()
+        self.ttfw_samples = deque(maxlen=200)
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"llm-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+            
+    def submit(self, prompt: str, context: str = "", on_done: Optional[Callable] = None, villager=None,
+               stream: bool = False, on_token: Optional[Callable] = None) -> LLMRequest:
+        request = LLMRequest(prompt, context, on_done, villager, stream, on_token)
+        self._track(request)
+        self.jobs.put(request)
+        return request
+        
+    def _track(self, request: LLMRequest):
+        request.future.add_done_callback(lambda _: self.completed.put((request, None)))
+        self.in_flight.add(request)
+        
+    def _worker_loop(self):
+        while True:
+            request = self.jobs.get()
+            if request is None:
+                break
+            self._execute(request)
+            
+    def _execute(self, request: LLMRequest):
+        if not request.future.set_running_or_notify_cancel():
+            return
+        request.started_at = time.perf_counter()
+        try:
+            if request.stream:
+                result = self._run_streaming(request)
+            else:
+                result = self.api.get_response(request.prompt, request.context)
+                request.complete = True
+                if request.first_word_at is None:
+                    request.first_word_at = time.perf_counter()
+        except Exception as e:
+            request.finished_at = time.perf_counter()
+            request.future.set_exception(e)
+        else:
+            request.finished_at = time.perf_counter()
+            request.future.set_result(result)
+            
+    def _run_streaming(self, request: LLMRequest) -> str:
+        tokens = []
+        stream = self.api.stream_response(request.prompt, request.context)
+        try:
+            for token in stream:
+                if request.cancelled:
+                    break
+                if request.first_word_at is None and token.strip():
+                    request.first_word_at = time.perf_counter()
+                tokens.append(token)
+                self.completed.put((request, token))
+            else:
+                request.complete = True
+        finally:
+            # Closing the generator also closes the underlying HTTP response.
+            stream.close()
+        return "".join(tokens).strip()
+        
+    def poll(self):
+        # Runs on the main thread so callbacks can touch game state safely.
+        while True:
+            try:
+                request, token = self.completed.get_nowait()
+            except queue.Empty:
+                break
+            if request.cancelled or request.future.cancelled():
+                if token is None:
+                    self.in_flight.discard(request)
+                    # Its owner never got to cancel it, so tell them it has no result.
+                    if request.dropped and request.on_done:
+                        request.on_done(request)
+                continue
+            if token is not None:
+                if request.on_token:
+                    request.on_token(request, token)
+                continue
+            self.in_flight.discard(request)
+            if request.time_to_first_word is not None:
+                self.ttfw_samples.append(request.time_to_first_word)
+            if self.on_complete:
+                self.on_complete(request)
+            if request.on_done:
+                request.on_done(request)
+                
+    def time_to_first_word_stats(self) -> dict:
+        samples = sorted(self.ttfw_samples)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "last": self.ttfw_samples[-1],
+            "mean": statistics.fmean(samples),
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        }
+        
+    def cancel_all(self):
+        for request in list(self.in_flight):
+            request.cancel()
+            
+    def shutdown(self):
+        self.cancel_all()
+        for _ in self.workers:
+            self.jobs.put(None)
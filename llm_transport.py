@@ -0,0 +1,198 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+RETRYABLE_STATUS = (502, 503, 504)
+
+class CircuitOpenError(Exception):
+    pass
+
+class IncompleteResponseError(Exception):
+    # A streamed reply that broke off before the server said it was done.
+    pass
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+        
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                # Let exactly one probe through; everyone else keeps failing fast.
+                self.trial_in_flight = True
+                return True
+            return False
+            
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+            
+    def record_failure(self) -> bool:
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                tripped = self.state != self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return tripped
+            return False
+
+class RetryBudget:
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 3.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+        self.lock = threading.Lock()
+        
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+            
+    def withdraw(self) -> bool:
+        with self.lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+class HTTPTransport:
+    def __init__(self, pool_size: int = 4, connect_timeout: float = 2.0, read_timeout: float = 20.0,
+                 max_retries: int = 2, backoff_base: float = 0.25, backoff_cap: float = 2.0,
+                 breaker: CircuitBreaker = None, retry_budget: RetryBudget = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "breaker_trips": 0,
+            "fast_failures": 0
+        }
+        self.counter_lock = threading.Lock()
+        
+    def _count(self, name: str, amount: int = 1):
+        with self.counter_lock:
+            self.counters[name] += amount
+            
+    def post(self, url: str, json: dict, stream: bool = False) -> requests.Response:
+        if not self.breaker.allow():
+            self._count("fast_failures")
+            raise CircuitOpenError(url)
+            
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            self._count("requests")
+            response = None
+            try:
+                response = self.session.post(url, json=json, timeout=self.timeout, stream=stream)
+            except requests.ConnectionError as e:
+                if isinstance(e, requests.Timeout):
+                    self._count("timeouts")
+                error = e
+            except requests.RequestException as e:
+                # Read timeouts are not retried: the server is up but slow, and
+                # another attempt would just wait out the same timeout again.
+                if isinstance(e, requests.Timeout):
+                    self._count("timeouts")
+                self._record_failure()
+                raise
+            else:
+                if response.status_code >= 500 and response.status_code not in RETRYABLE_STATUS:
+                    # A plain 500 (LM Studio with no model loaded) won't go away
+                    # on retry, but the server is still not answering.
+                    self._record_failure()
+                    return response
+                if response.status_code not in RETRYABLE_STATUS:
+                    # A streamed 200 has only sent its headers; the caller
+                    # reports how the body went through finish_stream.
+                    if not (stream and response.status_code == 200):
+                        self.breaker.record_success()
+                    return response
+                error = None
+                
+            if attempt >= self.max_retries or not self.retry_budget.withdraw():
+                self._record_failure()
+                if response is not None:
+                    return response
+                raise error
+                
+            if response is not None:
+                response.close()
+            attempt += 1
+            self._count("retries")
+            # Full jitter keeps several villagers from retrying in lockstep.
+            time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+            
+    def finish_stream(self, error: Exception = None):
+        # Called once the body of a streamed 200 has been read to the end,
+        # or has broken off with `error`.
+        if error is None:
+            self.breaker.record_success()
+            return
+        # A read timeout part way through the body reaches us as a
+        # ConnectionError wrapping urllib3's ReadTimeoutError.
+        if isinstance(error, requests.Timeout) or (error.args and isinstance(error.args[0], ReadTimeoutError)):
+            self._count("timeouts")
+        self._record_failure()
+        
+    def _record_failure(self):
+        self._count("failures")
+        if self.breaker.record_failure():
+            self._count("breaker_trips")
+            
+    def pool_stats(self) -> dict:
+        connections = 0
+        pooled_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+        return {
+            "pool_connections": connections,
+            "pool_requests": pooled_requests,
+            "pool_hits": max(0, pooled_requests - connections)
+        }
+        
+    def stats(self) -> dict:
+        with self.counter_lock:
+            stats = dict(self.counters)
+        stats.update(self.pool_stats())
+        stats["breaker_state"] = self.breaker.state
+        return stats
+        
+    def close(self):
+        self.session.close()
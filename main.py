@@ -3,14 +3,91 @@ import random
 import math
 import requests
 import json
+import os
 import time
-from typing import List, Dict, Tuple, Optional
+from functools import partial
+from typing import List, Dict, Tuple, Optional, Iterator
+from llm_broker import LLMBroker, PRIORITY_EVENT, PRIORITY_AMBIENT, PRIORITY_NAMES
+from prefetch import GreetingPrefetcher
+from llm_transport import HTTPTransport, CircuitOpenError, IncompleteResponseError
+from response_cache import ResponseCache
+from spatial import SpatialHash
+from sim_numpy import NumpyVillagerSim
+from renderer import DirtyRectRenderer
+from text_cache import TextCache
+from navigation import NavGrid, PathRoute, FlowRoute
+from profiler import Profiler
+from scheduler import TimerWheel
+from memory_store import MemoryStore
+from world import World, Camera
+from intents import IntentMatcher
+from savegame import AutoSaver, GameState, villager_key, villager_state, restore_villager, memory_mark
 
 pygame.init()
 
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
+WORLD_WIDTH = SCREEN_WIDTH * 4
+WORLD_HEIGHT = SCREEN_HEIGHT * 4
+VILLAGE_AREA = (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+WORLD_PROCEDURAL = True
+WORLD_SEED = 1
+CHUNK_SIZE = 512
+CHUNK_TREES = 4
+CHUNK_VILLAGERS = 1
+WORLD_SWEEP_TICKS = 30
+CAMERA_DEADZONE = 0.25
 FPS = 60
+SIM_HZ = 60
+MAX_SIM_STEPS_PER_FRAME = 5
+LLM_WORKERS = 4
+LLM_STREAMING = True
+LLM_CONNECT_TIMEOUT = 2.0
+LLM_READ_TIMEOUT = 20.0
+LLM_MAX_RETRIES = 2
+LLM_BACKGROUND_SLOTS = 1
+LLM_BACKGROUND_QUEUE = 16
+LLM_BATCH_SIZE = 4
+LLM_EVENT_DEADLINE = 8.0
+LLM_CHATTER_DEADLINE = 20.0
+AMBIENT_CHATTER = True
+CHATTER_CHANCE = 1 / 600
+CHATTER_RADIUS = 96
+CHATTER_MAX_PRESSURE = 0.5
+SPEECH_SECONDS = 5.0
+DIALOG_LINES = 3
+SPECULATIVE_GREETINGS = True
+PREFETCH_CHECK_TICKS = 6
+PREFETCH_DWELL = 3
+PREFETCH_MAX_PER_MINUTE = 6
+PREFETCH_TTL = 60.0
+PREFETCH_DEADLINE = 10.0
+PREFETCH_MAX_PRESSURE = 0.5
+MEMORY_TOKEN_BUDGET = 160
+MEMORY_RECENT_WINDOW = 20
+MEMORY_EPISODE_SIZE = 10
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 600.0
+RESPONSE_CACHE_KEY_FIELDS = ("backstory", "hp")
+RESPONSE_CACHE_PATH = None
+SPATIAL_CELL_SIZE = 64
+SIM_BACKEND = "python"
+SIM_SCHEDULER = True
+SCHEDULER_SLOTS = 256
+LOD_NEAR_MARGIN = 128
+LOD_FAR_DISTANCE = 1024
+LOD_MID_INTERVAL = 4
+LOD_FAR_INTERVAL = 60
+TEXT_CACHE_SIZE = 2048
+NAV_CELL_SIZE = 16
+NAV_ARRIVAL_MARGIN = NAV_CELL_SIZE
+NAV_STUCK_TICKS = 60
+PROFILER_ENABLED = False
+PROFILER_EXPORT_PATH = None
+PROFILER_EXPORT_INTERVAL = 10.0
+# Next to the game rather than wherever it was started from; VILLAGE_SAVE_PATH overrides it.
+SAVE_PATH = os.environ.get("VILLAGE_SAVE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "village.sav")
+AUTOSAVE_INTERVAL = 30.0
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -21,38 +98,138 @@ RED = (255, 0, 0)
 GRAY = (128, 128, 128)
 DARK_GREEN = (0, 100, 0)
 
+DIRECTION_VECTORS = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+text_cache = TextCache(TEXT_CACHE_SIZE)
+profiler = Profiler(
+    enabled=PROFILER_ENABLED or bool(PROFILER_EXPORT_PATH),
+    export_path=PROFILER_EXPORT_PATH,
+    export_interval=PROFILER_EXPORT_INTERVAL
+)
+
+OFFLINE_LINES = [
+    "Hmm? Sorry, my mind is elsewhere today. Ask me again later.",
+    "*yawns* I'm too tired to chat right now, friend.",
+    "Not now, I've got a lot on my mind. Come back in a bit.",
+    "Eh? Oh, I was lost in thought. Let's talk later."
+]
+NO_RESPONSE_LINE = "Sorry, I can't respond right now."
+UNSURE_LINE = "I'm not sure what to say right now."
+GREETING_PROMPT = "The player has just walked up to you. Greet them in one short sentence."
+
+OUTSKIRTS_NAMES = ["Edith", "Finn", "Greta", "Hugo", "Ivy", "Jonas", "Kira", "Leo", "Mabel", "Ned", "Olive", "Piet"]
+OUTSKIRTS_TRADES = ["shepherd", "woodcutter", "herbalist", "hunter", "miller", "travelling tinker"]
+
+# Phrases resolved locally instead of asking the LLM, with the entity kind each one needs after it.
+INTENT_VERBS = {
+    "follow": (None, ["follow me", "come with me", "come along", "walk with me", "tag along"]),
+    "stop": (None, ["stop following", "stay here", "wait here", "stay put", "stay there", "wait there"]),
+    "go_to": ("location", ["go to", "go over to", "head to", "head over to", "walk to", "run to", "move to"]),
+    "attack": ("villager", ["attack", "hit", "fight", "punch", "kill", "hurt", "beat up"])
+}
+
 class LMStudioAPI:
-    def __init__(self, base_url="http://127.0.0.1:1234"):
+    def __init__(self, base_url="http://127.0.0.1:1234", transport: Optional[HTTPTransport] = None):
         self.base_url = base_url
+        self.transport = transport or HTTPTransport(
+            pool_size=LLM_WORKERS,
+            connect_timeout=LLM_CONNECT_TIMEOUT,
+            read_timeout=LLM_READ_TIMEOUT,
+            max_retries=LLM_MAX_RETRIES
+        )
+        
+    def _build_request(self, prompt: str, character_context: str, stream: bool = False) -> dict:
+        return {
+            "model": "mistral-nemo-instruct-2407",
+            "messages": [
+                {"role": "system", "content": character_context},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 150,
+            "stream": stream
+        }
         
     def get_response(self, prompt: str, character_context: str = "") -> str:
         try:
             full_prompt = f"{character_context}\n\nPlayer says: {prompt}\n\nResponse:"
             
-            data = {
-                "model": "mistral-nemo-instruct-2407",
-                "messages": [
-                    {"role": "system", "content": character_context},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 150
-            }
-            
-            response = requests.post(
+            data = self._build_request(prompt, character_context)
+            
+            response = self.transport.post(
                 f"{self.base_url}/v1/chat/completions",
-                json=data,
-                timeout=20
+                json=data
             )
             
             if response.status_code == 200:
                 result = response.json()
                 return result['choices'][0]['message']['content'].strip()
             else:
-                return "I'm not sure what to say right now."
+                return UNSURE_LINE
                 
-        except Exception as e:
-            return f"Sorry, I can't respond right now."
+        except CircuitOpenError:
+            return random.choice(OFFLINE_LINES)
+        except (requests.RequestException, ValueError, KeyError, IndexError):
+            return NO_RESPONSE_LINE
+            
+    @staticmethod
+    def is_fallback(response: str) -> bool:
+        return response in OFFLINE_LINES or response in (NO_RESPONSE_LINE, UNSURE_LINE)
+        
+    def stream_response(self, prompt: str, character_context: str = "") -> Iterator[str]:
+        try:
+            response = self.transport.post(
+                f"{self.base_url}/v1/chat/completions",
+                json=self._build_request(prompt, character_context, stream=True),
+                stream=True
+            )
+        except CircuitOpenError:
+            yield random.choice(OFFLINE_LINES)
+            return
+        except requests.RequestException:
+            yield NO_RESPONSE_LINE
+            return
+            
+        with response:
+            if response.status_code != 200:
+                yield UNSURE_LINE
+                return
+                
+            response.encoding = "utf-8"
+            # Only [DONE] or a finish_reason makes a reply complete; a stream
+            # that drops or times out part way raises, so the cut-off text is
+            # never mistaken for the whole answer.
+            finished = False
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        finished = True
+                        break
+                    try:
+                        choice = json.loads(payload)['choices'][0]
+                        token = choice['delta'].get('content')
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if token:
+                        yield token
+                    if choice.get('finish_reason'):
+                        finished = True
+            except requests.RequestException as e:
+                self.transport.finish_stream(e)
+                raise IncompleteResponseError(str(e)) from e
+            except GeneratorExit:
+                # The reader stopped listening (a cancelled request); the
+                # server itself was answering fine.
+                self.transport.finish_stream()
+                raise
+            if not finished:
+                error = IncompleteResponseError("stream ended before the reply was finished")
+                self.transport.finish_stream(error)
+                raise error
+            self.transport.finish_stream()
 
 class Sprite:
     def __init__(self, x: int, y: int, width: int, height: int, color: tuple):
@@ -62,15 +239,35 @@ class Sprite:
         self.height = height
         self.color = color
         self.rect = pygame.Rect(x, y, width, height)
+        self.prev_x = x
+        self.prev_y = y
+        
+    def render_position(self, alpha: float = 1.0) -> Tuple[int, int]:
+        if alpha >= 1.0:
+            return self.x, self.y
+        return (
+            round(self.prev_x + (self.x - self.prev_x) * alpha),
+            round(self.prev_y + (self.y - self.prev_y) * alpha)
+        )
         
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.color, self.rect)
+    def draw(self, screen, alpha: float = 1.0, offset: Tuple[int, int] = (0, 0)) -> pygame.Rect:
+        x, y = self.render_position(alpha)
+        return pygame.draw.rect(screen, self.color, (x - offset[0], y - offset[1], self.width, self.height))
         
     def update_position(self, x: int, y: int):
+        # Called once per simulation tick, so the old position is what the renderer interpolates from.
+        self.prev_x = self.x
+        self.prev_y = self.y
         self.x = x
         self.y = y
         self.rect.x = x
         self.rect.y = y
+        
+    def place(self, x: int, y: int):
+        # Moves without leaving an interpolation trail from the old position.
+        self.update_position(x, y)
+        self.prev_x = x
+        self.prev_y = y
 
 class Player:
     def __init__(self, x: int, y: int):
@@ -82,7 +279,7 @@ class Player:
         self.sprite = Sprite(x, y, self.width, self.height, BLUE)
         self.direction = "down"
         
-    def update(self, keys):
+    def update(self, keys, obstacles=None):
         old_x, old_y = self.x, self.y
         
         if keys[pygame.K_LEFT] or keys[pygame.K_a]:
@@ -98,9 +295,12 @@ class Player:
             self.y += self.speed
             self.direction = "down"
             
-        self.x = max(0, min(SCREEN_WIDTH - self.width, self.x))
-        self.y = max(0, min(SCREEN_HEIGHT - self.height, self.y))
+        self.x = max(0, min(WORLD_WIDTH - self.width, self.x))
+        self.y = max(0, min(WORLD_HEIGHT - self.height, self.y))
         
+        if obstacles is not None and obstacles.collides(pygame.Rect(self.x, self.y, self.width, self.height)):
+            self.x, self.y = old_x, old_y
+            
         self.sprite.update_position(self.x, self.y)
         
     def get_front_position(self) -> Tuple[int, int]:
@@ -114,8 +314,8 @@ class Player:
             return (self.x + 40, self.y)
         return (self.x, self.y)
         
-    def draw(self, screen):
-        self.sprite.draw(screen)
+    def draw(self, screen, alpha: float = 1.0, offset: Tuple[int, int] = (0, 0)) -> pygame.Rect:
+        return self.sprite.draw(screen, alpha, offset)
 
 class Villager:
     def __init__(self, x: int, y: int, name: str, backstory: str):
@@ -131,50 +331,92 @@ class Villager:
         self.sprite = Sprite(x, y, self.width, self.height, RED)
         self.hp = 10
         self.max_hp = 10
-        self.memory = []
+        self.memory = MemoryStore(MEMORY_RECENT_WINDOW, MEMORY_EPISODE_SIZE)
         self.current_task = None
         self.target_pos = None
+        self.route = None
+        self.route_stuck_ticks = 0
         self.following_player = False
         self.fleeing = False
         self.seeking_help = False
         self.move_timer = 0
         self.move_direction = random.choice(["up", "down", "left", "right"])
+        self.event_log = None
+        self.spawn_key = None
+        self.speech = None
+        self.speech_until = 0.0
         
     def add_memory(self, interaction: str):
-        self.memory.append(f"{time.strftime('%H:%M')} - {interaction}")
-        if len(self.memory) > 10:
-            self.memory.pop(0)
+        self.memory.add(interaction)
+        
+    def notify(self, event: str):
+        if self.event_log is not None:
+            self.event_log.append((self, event))
             
-    def get_context(self) -> str:
+    def say(self, text: str):
+        self.speech = text
+        self.speech_until = time.monotonic() + SPEECH_SECONDS
+        
+    def get_context(self, query: str = "") -> str:
         context = f"You are {self.name}. {self.backstory}\n"
         context += f"Your current HP: {self.hp}/{self.max_hp}\n"
         if self.memory:
-            context += "Recent memories:\n" + "\n".join(self.memory[-3:]) + "\n"
+            context += self.memory.build_context(query, MEMORY_TOKEN_BUDGET) + "\n"
         context += "Respond in character as a villager in this game world. Keep responses brief and natural."
         return context
         
+    def get_context_fields(self) -> dict:
+        return {
+            "name": self.name,
+            "backstory": self.backstory,
+            "hp": self.hp,
+            "max_hp": self.max_hp,
+            "fleeing": self.fleeing,
+            "following_player": self.following_player,
+            "current_task": self.current_task
+        }
+        
+    @property
+    def busy(self) -> bool:
+        return bool(self.fleeing or self.following_player or self.current_task)
+        
+    def ticks_until_event(self) -> Optional[int]:
+        # How many ticks update() can be skipped without missing anything it
+        # would do on its own; None if nothing happens until something from
+        # outside (an attack, an order) changes the villager.
+        if self.hp <= 0:
+            return None
+        if self.busy or self.move_direction != "stop":
+            return 1
+        return 121 - self.move_timer
+        
     def update(self, player, villagers, obstacles):
         self.move_timer += 1
         
         if self.hp <= 0:
             return
             
-        if self.hp <= 4 and not self.fleeing:
-            self.fleeing = True
-            self.seeking_help = True
-            self.add_memory("Started fleeing due to low health!")
+        if profiler.enabled:
+            started = time.perf_counter()
             
         if self.fleeing:
+            behavior = "flee"
             self._flee_behavior(player, obstacles)
         elif self.following_player:
+            behavior = "follow"
             self._follow_player(player, obstacles)
         elif self.current_task:
+            behavior = "task"
             self._execute_task(villagers, obstacles)
         else:
+            behavior = "wander"
             self._random_walk(obstacles)
             
         self.sprite.update_position(self.x, self.y)
         
+        if profiler.enabled:
+            profiler.add(f"villager.{behavior}", time.perf_counter() - started)
+            
     def _random_walk(self, obstacles):
         if self.move_timer > 120:
             self.move_timer = 0
@@ -194,10 +436,38 @@ class Villager:
         elif self.move_direction == "right":
             self.x += self.speed
             
-        if self._check_collision(obstacles) or self.x < 0 or self.x > SCREEN_WIDTH - self.width or self.y < 0 or self.y > SCREEN_HEIGHT - self.height:
+        if self._check_collision(obstacles) or self.x < 0 or self.x > WORLD_WIDTH - self.width or self.y < 0 or self.y > WORLD_HEIGHT - self.height:
             self.x, self.y = old_x, old_y
             self.move_direction = random.choice(["up", "down", "left", "right"])
             
+    def coarse_update(self, obstacles, ticks: int):
+        # Off-screen stand-in for `ticks` calls to update() while wandering:
+        # each straight run between direction changes is one move with one
+        # collision test over the whole swept rect.
+        if self.hp <= 0:
+            self.move_timer += ticks
+            return
+        while ticks > 0:
+            run = min(ticks, max(1, 121 - self.move_timer))
+            ticks -= run
+            self.move_timer += run
+            if self.move_direction != "stop":
+                self._slide(obstacles, run * self.speed)
+            if self.move_timer > 120:
+                self.move_timer = 0
+                self.move_direction = random.choice(["up", "down", "left", "right", "stop"])
+        self.sprite.place(self.x, self.y)
+        
+    def _slide(self, obstacles, distance: int):
+        dx, dy = DIRECTION_VECTORS[self.move_direction]
+        x = max(0, min(WORLD_WIDTH - self.width, self.x + dx * distance))
+        y = max(0, min(WORLD_HEIGHT - self.height, self.y + dy * distance))
+        start = pygame.Rect(self.x, self.y, self.width, self.height)
+        if (x, y) == (self.x, self.y) or obstacles.collides(start.union(pygame.Rect(x, y, self.width, self.height))):
+            self.move_direction = random.choice(["up", "down", "left", "right"])
+            return
+        self.x, self.y = x, y
+        
     def _follow_player(self, player, obstacles):
         dx = player.x - self.x
         dy = player.y - self.y
@@ -225,8 +495,8 @@ class Villager:
             else:
                 self.y += -self.speed*2 if dy > 0 else self.speed*2
                 
-            self.x = max(0, min(SCREEN_WIDTH - self.width, self.x))
-            self.y = max(0, min(SCREEN_HEIGHT - self.height, self.y))
+            self.x = max(0, min(WORLD_WIDTH - self.width, self.x))
+            self.y = max(0, min(WORLD_HEIGHT - self.height, self.y))
             
             if self._check_collision(obstacles):
                 self.x, self.y = old_x, old_y
@@ -235,7 +505,9 @@ class Villager:
             
     def _execute_task(self, villagers, obstacles):
         if self.current_task and "go to" in self.current_task.lower():
-            if self.target_pos:
+            if self.route:
+                self._follow_route(obstacles)
+            elif self.target_pos:
                 dx = self.target_pos[0] - self.x
                 dy = self.target_pos[1] - self.y
                 distance = math.sqrt(dx*dx + dy*dy)
@@ -254,35 +526,102 @@ class Villager:
                     if self._check_collision(obstacles):
                         self.x, self.y = old_x, old_y
                         
+    def _follow_route(self, obstacles):
+        if self.route.arrived(self.x, self.y):
+            self.current_task = None
+            self.target_pos = None
+            self.route = None
+            self.add_memory("Arrived at destination")
+            return
+            
+        waypoint = self.route.next_waypoint(self.x, self.y)
+        if waypoint is None:
+            self._abandon_route()
+            return
+            
+        dx = waypoint[0] - self.x
+        dy = waypoint[1] - self.y
+        step = self.speed * 2
+        old_x, old_y = self.x, self.y
+        if abs(dx) > abs(dy):
+            self.x += max(-step, min(step, dx))
+        else:
+            self.y += max(-step, min(step, dy))
+            
+        if self._check_collision(obstacles):
+            self.x, self.y = old_x, old_y
+            self.route_stuck_ticks += 1
+            if self.route_stuck_ticks > NAV_STUCK_TICKS:
+                self._abandon_route()
+        else:
+            self.route_stuck_ticks = 0
+            
+    def _abandon_route(self):
+        self.current_task = None
+        self.target_pos = None
+        self.route = None
+        self.route_stuck_ticks = 0
+        self.add_memory("Couldn't find a way to my destination")
+        
     def _check_collision(self, obstacles) -> bool:
         temp_rect = pygame.Rect(self.x, self.y, self.width, self.height)
-        for obstacle in obstacles:
-            if temp_rect.colliderect(obstacle):
-                return True
-        return False
+        return obstacles.collides(temp_rect)
         
     def take_damage(self):
         self.hp -= 1
         self.add_memory("Was attacked by the player!")
         if self.hp <= 0:
             self.add_memory("Was defeated!")
-            
-    def draw(self, screen, font):
+        else:
+            self.notify("attacked")
+            if self.hp <= 4 and not self.fleeing:
+                self.start_fleeing()
+                
+    def start_fleeing(self):
+        # Only an attack starts a flight; a villager who got away stays put
+        # until they are hurt again.
+        self.fleeing = True
+        self.seeking_help = True
+        self.add_memory("Started fleeing due to low health!")
+        self.notify("fleeing")
+        
+    def draw(self, screen, font, alpha: float = 1.0, offset: Tuple[int, int] = (0, 0)) -> Optional[pygame.Rect]:
         if self.hp > 0:
-            self.sprite.draw(screen)
+            x, y = self.sprite.render_position(alpha)
+            x -= offset[0]
+            y -= offset[1]
+            sprite_rect = self.sprite.draw(screen, alpha, offset)
             
-            name_surface = font.render(self.name, True, BLACK)
-            name_rect = name_surface.get_rect(center=(self.x + self.width//2, self.y - 15))
+            name_surface = text_cache.render(font, self.name, True, BLACK)
+            name_rect = name_surface.get_rect(center=(x + self.width//2, y - 15))
             screen.blit(name_surface, name_rect)
             
             hp_bar_width = 30
             hp_bar_height = 4
             hp_percentage = self.hp / self.max_hp
-            hp_bar_x = self.x + (self.width - hp_bar_width) // 2
-            hp_bar_y = self.y - 25
+            hp_bar_x = x + (self.width - hp_bar_width) // 2
+            hp_bar_y = y - 25
             
-            pygame.draw.rect(screen, RED, (hp_bar_x, hp_bar_y, hp_bar_width, hp_bar_height))
+            hp_rect = pygame.draw.rect(screen, RED, (hp_bar_x, hp_bar_y, hp_bar_width, hp_bar_height))
             pygame.draw.rect(screen, GREEN, (hp_bar_x, hp_bar_y, hp_bar_width * hp_percentage, hp_bar_height))
+            
+            drawn = sprite_rect.union(name_rect).union(hp_rect)
+            if self.speech and time.monotonic() < self.speech_until:
+                drawn = drawn.union(self._draw_speech(screen, font, x + self.width // 2, hp_bar_y - 4))
+            return drawn
+        return None
+        
+    def _draw_speech(self, screen, font, center_x: int, bottom: int) -> pygame.Rect:
+        lines = wrap_text(self.speech, font, 180)[:2]
+        line_height = font.get_linesize()
+        width = max(font.size(line)[0] for line in lines) + 8
+        bubble = pygame.Rect(0, 0, width, line_height * len(lines) + 4)
+        bubble.midbottom = (center_x, bottom)
+        pygame.draw.rect(screen, WHITE, bubble)
+        pygame.draw.rect(screen, BLACK, bubble, 1)
+        for i, line in enumerate(lines):
+            screen.blit(text_cache.render(font, line, True, BLACK), (bubble.x + 4, bubble.y + 2 + i * line_height))
+        return bubble
 
 class House:
     def __init__(self, x: int, y: int, label: str):
@@ -293,12 +632,13 @@ class House:
         self.label = label
         self.rect = pygame.Rect(x, y, self.width, self.height)
         
-    def draw(self, screen, font):
-        pygame.draw.rect(screen, BROWN, self.rect)
-        pygame.draw.rect(screen, BLACK, self.rect, 2)
+    def draw(self, screen, font, offset: Tuple[int, int] = (0, 0)):
+        rect = self.rect.move(-offset[0], -offset[1])
+        pygame.draw.rect(screen, BROWN, rect)
+        pygame.draw.rect(screen, BLACK, rect, 2)
         
-        label_surface = font.render(self.label, True, BLACK)
-        label_rect = label_surface.get_rect(center=(self.x + self.width//2, self.y + self.height + 10))
+        label_surface = text_cache.render(font, self.label, True, BLACK)
+        label_rect = label_surface.get_rect(center=(rect.x + self.width//2, rect.y + self.height + 10))
         screen.blit(label_surface, label_rect)
 
 class Tree:
@@ -309,9 +649,24 @@ class Tree:
         self.height = 60
         self.rect = pygame.Rect(x, y, self.width, self.height)
         
-    def draw(self, screen):
-        pygame.draw.rect(screen, BROWN, (self.x + 15, self.y + 40, 10, 20))
-        pygame.draw.circle(screen, DARK_GREEN, (self.x + 20, self.y + 20), 20)
+    def draw(self, screen, offset: Tuple[int, int] = (0, 0)):
+        x, y = self.x - offset[0], self.y - offset[1]
+        pygame.draw.rect(screen, BROWN, (x + 15, y + 40, 10, 20))
+        pygame.draw.circle(screen, DARK_GREEN, (x + 20, y + 20), 20)
+
+def wrap_text(text: str, font, max_width: int) -> List[str]:
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ""
+        for word in paragraph.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if line and font.size(candidate)[0] > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
 
 class DialogBox:
     def __init__(self):
@@ -320,6 +675,8 @@ class DialogBox:
         self.input_text = ""
         self.response_text = ""
         self.current_villager = None
+        self.pending_request = None
+        self.scroll = 0
         
     def show(self, villager):
         self.active = True
@@ -327,14 +684,40 @@ class DialogBox:
         self.text = f"Talking to {villager.name}"
         self.input_text = ""
         self.response_text = ""
+        self.scroll = 0
         
     def hide(self):
+        self.cancel_pending()
         self.active = False
         self.current_villager = None
         self.text = ""
         self.input_text = ""
         self.response_text = ""
         
+    def set_pending(self, request):
+        self.cancel_pending()
+        self.pending_request = request
+        self.response_text = ""
+        self.scroll = 0
+        
+    def cancel_pending(self):
+        if self.pending_request:
+            self.pending_request.cancel()
+            self.pending_request = None
+            
+    @property
+    def thinking(self) -> bool:
+        return self.pending_request is not None and not self.response_text
+        
+    def append_response(self, token: str):
+        if not self.response_text:
+            token = token.lstrip()
+        self.response_text += token
+        
+    def scroll_by(self, lines: int):
+        # Clamped against the wrapped reply when it is next drawn.
+        self.scroll = max(0, self.scroll + lines)
+        
     def add_char(self, char):
         if len(self.input_text) < 100:
             self.input_text += char
@@ -343,40 +726,96 @@ class DialogBox:
         if self.input_text:
             self.input_text = self.input_text[:-1]
             
-    def draw(self, screen, font):
+    def draw(self, screen, font) -> Optional[pygame.Rect]:
         if not self.active:
-            return
+            return None
             
         dialog_rect = pygame.Rect(50, SCREEN_HEIGHT - 200, SCREEN_WIDTH - 100, 150)
         pygame.draw.rect(screen, WHITE, dialog_rect)
         pygame.draw.rect(screen, BLACK, dialog_rect, 2)
         
-        title_surface = font.render(self.text, True, BLACK)
+        title_surface = text_cache.render(font, self.text, True, BLACK)
         screen.blit(title_surface, (dialog_rect.x + 10, dialog_rect.y + 10))
         
-        if self.response_text:
-            response_lines = self.response_text.split('\n')
-            for i, line in enumerate(response_lines[:3]):
-                response_surface = font.render(line, True, BLUE)
+        if self.thinking:
+            dots = "." * (pygame.time.get_ticks() // 300 % 4)
+            thinking_surface = text_cache.render(font, f"{self.current_villager.name} is thinking{dots}", True, GRAY)
+            screen.blit(thinking_surface, (dialog_rect.x + 10, dialog_rect.y + 40))
+        elif self.response_text:
+            response_lines = wrap_text(self.response_text, font, dialog_rect.width - 20)
+            # Follow the newest text while a reply streams in; once it is
+            # complete, read it from the top and page with Up/Down.
+            if self.pending_request is not None:
+                start = max(0, len(response_lines) - DIALOG_LINES)
+            else:
+                self.scroll = start = min(self.scroll, max(0, len(response_lines) - DIALOG_LINES))
+            shown = response_lines[start:start + DIALOG_LINES]
+            for i, line in enumerate(shown):
+                # The last line of a reply that is still streaming changes with
+                # every token, so like the input line it bypasses the cache.
+                if self.pending_request is not None and i == len(shown) - 1:
+                    response_surface = font.render(line, True, BLUE)
+                else:
+                    response_surface = text_cache.render(font, line, True, BLUE)
                 screen.blit(response_surface, (dialog_rect.x + 10, dialog_rect.y + 40 + i * 20))
-                
+            if self.pending_request is None and len(response_lines) > DIALOG_LINES:
+                more = []
+                if start > 0:
+                    more.append("Up")
+                if start + DIALOG_LINES < len(response_lines):
+                    more.append("Down")
+                if more:
+                    more_surface = text_cache.render(font, "more: " + "/".join(more), True, GRAY)
+                    screen.blit(more_surface, (dialog_rect.right - more_surface.get_width() - 10, dialog_rect.y + 10))
+                    
+        # The input line changes with every keystroke, so it bypasses the cache.
         input_surface = font.render(f"You: {self.input_text}|", True, BLACK)
         screen.blit(input_surface, (dialog_rect.x + 10, dialog_rect.y + 110))
         
-        instructions = font.render("Type your message and press ENTER to send, ESC to close", True, GRAY)
+        instructions = text_cache.render(font, "Type your message and press ENTER to send, ESC to close", True, GRAY)
         screen.blit(instructions, (dialog_rect.x + 10, dialog_rect.y + 130))
+        
+        return dialog_rect
 
 class Game:
-    def __init__(self):
+    def __init__(self, ai_api=None, sim_backend: str = SIM_BACKEND, procedural: bool = WORLD_PROCEDURAL,
+                 save_path: Optional[str] = SAVE_PATH):
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Village AI Demo")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 24)
         self.small_font = pygame.font.Font(None, 16)
+        self.renderer = DirtyRectRenderer(self.screen, GREEN)
+        self.profiler = profiler
         
         self.player = Player(100, 100)
         self.dialog_box = DialogBox()
-        self.ai_api = LMStudioAPI()
+        self.ai_api = ai_api or LMStudioAPI()
+        self.llm_pipeline = LLMBroker(
+            self.ai_api,
+            max_workers=LLM_WORKERS,
+            background_slots=LLM_BACKGROUND_SLOTS,
+            max_queue=LLM_BACKGROUND_QUEUE,
+            max_batch=LLM_BATCH_SIZE,
+            on_complete=self._on_llm_complete
+        )
+        self.prefetcher = GreetingPrefetcher(
+            self.llm_pipeline,
+            GREETING_PROMPT,
+            lambda villager: villager.get_context(),
+            valid=lambda text: not LMStudioAPI.is_fallback(text),
+            dwell=PREFETCH_DWELL,
+            max_per_minute=PREFETCH_MAX_PER_MINUTE,
+            ttl=PREFETCH_TTL,
+            deadline=PREFETCH_DEADLINE,
+            max_pressure=PREFETCH_MAX_PRESSURE
+        )
+        self.response_cache = ResponseCache(
+            max_entries=RESPONSE_CACHE_SIZE,
+            ttl=RESPONSE_CACHE_TTL,
+            key_fields=RESPONSE_CACHE_KEY_FIELDS,
+            path=RESPONSE_CACHE_PATH
+        )
         
         self.houses = [
             House(200, 200, "House 1"),
@@ -400,144 +839,718 @@ class Game:
         ]
         
         self.obstacles = [house.rect for house in self.houses] + [tree.rect for tree in self.trees]
+        self.obstacle_index = SpatialHash(SPATIAL_CELL_SIZE)
+        self.navigation = NavGrid(WORLD_WIDTH, WORLD_HEIGHT, NAV_CELL_SIZE, (32, 32))
+        for obstacle in self.obstacles:
+            self.obstacle_index.insert(obstacle)
+            self.navigation.add_obstacle(obstacle)
+            
+        self.entity_index = SpatialHash(SPATIAL_CELL_SIZE)
+        self.entity_index.insert(self.player, self.player.sprite.rect)
+        self.villager_events = []
+        self.intents = IntentMatcher()
+        self.scheduler = TimerWheel(SCHEDULER_SLOTS)
+        for intent, (slot, phrases) in INTENT_VERBS.items():
+            for phrase in phrases:
+                self.intents.add_verb(intent, phrase, slot)
+        for house in self.houses:
+            self.intents.add_entity("location", house.label, house)
+        for villager in self.villagers:
+            self.entity_index.insert(villager, villager.sprite.rect)
+            self.intents.add_entity("villager", villager.name, villager.name)
+            self.scheduler.add(villager)
+            villager.event_log = self.villager_events
+            
+        self.sim_backend = sim_backend
+        self.numpy_sim = None
+        self.chatter_rng = random.Random(random.getrandbits(32))
         
-    def handle_talk(self):
-        front_x, front_y = self.player.get_front_position()
-        front_rect = pygame.Rect(front_x, front_y, 32, 32)
+        # The hand-placed village above is permanent; everything else in the
+        # larger world is generated chunk by chunk as the camera approaches.
+        self.camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT, WORLD_WIDTH, WORLD_HEIGHT, CAMERA_DEADZONE)
+        self.world = World(
+            WORLD_WIDTH,
+            WORLD_HEIGHT,
+            CHUNK_SIZE,
+            WORLD_SEED,
+            generate=self.generate_chunk if procedural else None
+        )
+        self.world_villagers = []
+        self.world_ticks = 0
+        self.camera.follow(self.player.x, self.player.y, self.player.width, self.player.height)
+        self.update_world()
+        
+        self.saver = AutoSaver(save_path) if save_path else None
+        if self.saver:
+            snapshot = self.saver.load(partial(MemoryStore, MEMORY_RECENT_WINDOW, MEMORY_EPISODE_SIZE))
+            if snapshot:
+                self.restore(snapshot)
+                
+        self.profiler.add_gauge("response_cache", self.response_cache.stats)
+        self.profiler.add_gauge("text_cache", text_cache.stats)
+        self.profiler.add_gauge("llm_ttfw", self.llm_pipeline.time_to_first_word_stats)
+        self.profiler.add_gauge("llm_broker", self.llm_pipeline.stats, overlay_keys=("queued_background", "expired", "shed"))
+        self.profiler.add_gauge("world", self.world.stats, overlay_keys=("loaded_chunks",))
+        self.profiler.add_gauge("prefetch", self.prefetcher.stats, overlay_keys=("hits", "wasted"))
+        self.profiler.add_gauge("scheduler", self.scheduler.stats, overlay_keys=("due",))
+        self.profiler.add_gauge("intents", self.intents.stats, overlay_keys=("llm_calls_saved",))
+        if self.saver:
+            self.profiler.add_gauge("autosave", self.saver.stats, overlay_keys=("last_save_ms",))
+        transport = getattr(self.ai_api, "transport", None)
+        if transport:
+            self.profiler.add_gauge("llm_transport", transport.stats, overlay_keys=("timeouts", "breaker_state"))
+            
+    def add_villager(self, villager):
+        self.villagers.append(villager)
+        self.entity_index.insert(villager, villager.sprite.rect)
+        self.intents.add_entity("villager", villager.name, villager.name)
+        self.scheduler.add(villager, tick=self.world_ticks)
+        villager.event_log = self.villager_events
+        self.numpy_sim = None
+        
+    def remove_villager(self, villager):
+        self.villagers.remove(villager)
+        self.entity_index.remove(villager)
+        self.intents.remove_entity("villager", villager.name, villager.name)
+        self.scheduler.remove(villager)
+        self.numpy_sim = None
+        
+    def add_tree(self, tree):
+        self.trees.append(tree)
+        self.add_obstacle(tree.rect)
+        self.renderer.invalidate()
+        for key in self.world.keys_in(tree.rect):
+            chunk = self.world.chunks.get(key)
+            if chunk:
+                chunk.surface = None
+        if self.numpy_sim:
+            self.numpy_sim.set_obstacles(self.obstacles)
+            
+    def add_obstacle(self, rect):
+        self.obstacles.append(rect)
+        self.obstacle_index.insert(rect)
+        self.navigation.add_obstacle(rect)
+        
+    def remove_obstacle(self, rect):
+        self.obstacles.remove(rect)
+        self.obstacle_index.remove(rect)
+        self.navigation.remove_obstacle(rect)
+        
+    def generate_chunk(self, key, rect, rng):
+        if rect.colliderect(VILLAGE_AREA):
+            return [], []
+        trees = []
+        for _ in range(CHUNK_TREES):
+            tree = Tree(rng.randint(rect.left, rect.right - 40), rng.randint(rect.top, rect.bottom - 60))
+            # Keep a villager-sized gap around every tree so the chunk stays walkable.
+            if tree.rect.inflate(64, 64).collidelist([other.rect for other in trees]) < 0:
+                trees.append(tree)
+        spawns = []
+        for i in range(CHUNK_VILLAGERS):
+            x = rng.randint(rect.left, rect.right - 32)
+            y = rng.randint(rect.top, rect.bottom - 32)
+            name = rng.choice(OUTSKIRTS_NAMES)
+            trade = rng.choice(OUTSKIRTS_TRADES)
+            backstory = f"You are {name}, a {trade} who lives out past the village. You don't get many visitors."
+            spawns.append(((key, i), partial(Villager, x, y, name, backstory)))
+        return trees, spawns
+        
+    def update_world(self):
+        changed = False
+        view = self.camera.rect
+        for key in self.world.stale(view):
+            chunk = self.world.unload(key)
+            for tree in chunk.props:
+                self.trees.remove(tree)
+                self.remove_obstacle(tree.rect)
+            for villager in [v for v in self.world_villagers if self.world.key_at(v.x, v.y) == key]:
+                self.park_villager(villager)
+            changed = True
+            
+        for key in self.world.missing(view):
+            chunk, villagers = self.world.load(key)
+            for tree in chunk.props:
+                self.trees.append(tree)
+                self.add_obstacle(tree.rect)
+            for villager in villagers:
+                self.unstick(villager)
+                self.add_villager(villager)
+                self.world_villagers.append(villager)
+            changed = True
+            
+        if changed and self.numpy_sim:
+            self.numpy_sim.set_obstacles(self.obstacles)
+            
+    def sweep_world(self):
+        # Villagers who wandered off the loaded area go to sleep with the chunk they are in.
+        for villager in list(self.world_villagers):
+            if not self.world.is_loaded(villager.x, villager.y):
+                self.park_villager(villager)
+                
+    def park_villager(self, villager):
+        if villager.busy:
+            return
+        self.remove_villager(villager)
+        self.world_villagers.remove(villager)
+        pristine = not villager.memory and villager.hp == villager.max_hp
+        self.world.park(villager, keep=not pristine)
+        
+    def unstick(self, villager):
+        rect = pygame.Rect(villager.x, villager.y, villager.width, villager.height)
+        if not self.obstacle_index.collides(rect):
+            return
+        for radius in range(NAV_CELL_SIZE, CHUNK_SIZE, NAV_CELL_SIZE):
+            for dx, dy in ((radius, 0), (-radius, 0), (0, radius), (0, -radius)):
+                candidate = rect.move(dx, dy)
+                if (0 <= candidate.x <= WORLD_WIDTH - rect.w and 0 <= candidate.y <= WORLD_HEIGHT - rect.h
+                        and not self.obstacle_index.collides(candidate)):
+                    villager.x, villager.y = candidate.topleft
+                    villager.sprite.place(villager.x, villager.y)
+                    return
+                    
+    def clear_world(self):
+        for key in list(self.world.chunks):
+            for tree in self.world.unload(key).props:
+                self.trees.remove(tree)
+                self.remove_obstacle(tree.rect)
+        for villager in self.world_villagers:
+            self.remove_villager(villager)
+        self.world_villagers.clear()
+        self.world.dormant.clear()
+        self.world.spawned.clear()
+        
+    def capture_save(self):
+        game_state = GameState(
+            self.player.x,
+            self.player.y,
+            self.player.direction,
+            self.camera.x,
+            self.camera.y,
+            self.world_ticks,
+            self.world.seed,
+            tuple(self.world.spawned)
+        )
+        villagers = [(villager, True) for villager in self.villagers]
+        villagers += [(villager, False) for parked in self.world.dormant.values() for villager in parked]
+        return game_state, [
+            (villager_key(villager), villager_state(villager, active), villager.memory, memory_mark(villager.memory))
+            for villager, active in villagers
+        ]
+        
+    def save_game(self, wait: bool = False) -> bool:
+        if not self.saver:
+            return False
+        with self.profiler.section("save.capture"):
+            game_state, villagers = self.capture_save()
+        return self.saver.save(game_state, villagers, wait)
+        
+    def restore(self, snapshot):
+        self.clear_world()
+        game = snapshot.game
+        self.player.x, self.player.y = game.player_x, game.player_y
+        self.player.direction = game.direction
+        self.player.sprite.place(game.player_x, game.player_y)
+        self.entity_index.update(self.player, self.player.sprite.rect)
+        self.camera.x, self.camera.y = game.camera_x, game.camera_y
+        self.world_ticks = game.ticks
+        self.scheduler.reset(game.ticks)
+        self.world.seed = game.seed
+        self.world.spawned.update(game.spawned)
         
+        saved = dict(snapshot.villagers)
         for villager in self.villagers:
-            if villager.hp > 0 and front_rect.colliderect(villager.sprite.rect):
-                self.dialog_box.show(villager)
-                return True
-        return False
+            key = villager_key(villager)
+            if key in saved:
+                restore_villager(villager, saved.pop(key))
+                villager.memory = snapshot.memories.get(key) or villager.memory
+                self.entity_index.update(villager, villager.sprite.rect)
+        for key, state in saved.items():
+            villager = Villager(state.x, state.y, state.name, state.backstory)
+            restore_villager(villager, state)
+            villager.memory = snapshot.memories.get(key) or villager.memory
+            if state.spawn_key is None:
+                self.add_villager(villager)
+            elif state.active:
+                self.add_villager(villager)
+                self.world_villagers.append(villager)
+            else:
+                self.world.dormant[self.world.key_at(villager.x, villager.y)].append(villager)
+                
+        # Routes are not saved; anyone who was on their way somewhere plans a fresh one.
+        for villager in self.villagers:
+            if villager.current_task and villager.target_pos:
+                house = next((h for h in self.houses if h.rect.center == villager.target_pos), None)
+                villager.route = self.plan_route(villager, house) if house else None
+                if villager.route is None:
+                    villager.current_task = None
+                    villager.target_pos = None
+                    
+        self.numpy_sim = None
+        self.update_world()
+        self.renderer.invalidate()
         
-    def handle_attack(self):
+    def get_numpy_sim(self) -> Optional[NumpyVillagerSim]:
+        if self.sim_backend != "numpy":
+            return None
+        if self.numpy_sim is None:
+            self.numpy_sim = NumpyVillagerSim(
+                self.villagers,
+                self.obstacles,
+                (WORLD_WIDTH, WORLD_HEIGHT),
+                seed=random.getrandbits(32),
+                stuck_ticks=NAV_STUCK_TICKS
+            )
+        return self.numpy_sim
+        
+    def update_villagers(self):
+        numpy_sim = self.get_numpy_sim()
+        if numpy_sim:
+            with self.profiler.section("villagers.numpy_step"):
+                numpy_sim.step(self.player)
+            with self.profiler.section("villagers.write_back"):
+                numpy_sim.write_back()
+            return
+            
+        if not SIM_SCHEDULER:
+            for villager in self.villagers:
+                villager.update(self.player, self.villagers, self.obstacle_index)
+                self.entity_index.update(villager, villager.sprite.rect)
+            return
+            
+        # Only villagers with something due this tick are looked at. Busy ones
+        # and wanderers walking near the screen ask for every tick, stopped
+        # ones sleep until they pick a new direction, the dead sleep until
+        # something happens to them, and walkers further out are looked at
+        # every LOD_MID_INTERVAL or LOD_FAR_INTERVAL ticks. Each wake-up
+        # catches up on the skipped ticks in one coarse step first. That is
+        # exact for villagers who stood still, but a walker whose run is
+        # blocked stays where the run started instead of walking up to the
+        # obstacle, so walkers only approximate per-tick updates. A mid-band
+        # walker is looked at again long before the camera can cover
+        # LOD_NEAR_MARGIN, so walkers are back at full rate before they show up.
+        tick = self.world_ticks
+        near = self.camera.rect.inflate(LOD_NEAR_MARGIN * 2, LOD_NEAR_MARGIN * 2)
+        far = self.camera.rect.inflate(LOD_FAR_DISTANCE * 2, LOD_FAR_DISTANCE * 2)
+        for villager, elapsed in self.scheduler.due(tick):
+            full = villager.busy or near.colliderect(villager.sprite.rect)
+            if full:
+                if elapsed > 1:
+                    villager.coarse_update(self.obstacle_index, elapsed - 1)
+                villager.update(self.player, self.villagers, self.obstacle_index)
+            else:
+                villager.coarse_update(self.obstacle_index, elapsed)
+            self.entity_index.update(villager, villager.sprite.rect)
+            wait = villager.ticks_until_event()
+            if wait is None:
+                continue
+            if wait == 1 and not full:
+                wait = LOD_MID_INTERVAL if far.colliderect(villager.sprite.rect) else LOD_FAR_INTERVAL
+            self.scheduler.schedule(villager, tick + wait)
+            
+    def plan_route(self, villager, house):
+        key = ("house", house.label)
+        goal_cells = self.navigation.cells_near(house.rect, NAV_ARRIVAL_MARGIN)
+        start = (villager.x, villager.y)
+        # The first villager sent somewhere gets a private A* path; once a
+        # second one heads there too they all share a cached flow field.
+        shared = key in self.navigation.flow_fields or any(
+            other is not villager and other.route is not None and other.route.key == key
+            for other in self.villagers
+        )
+        if shared:
+            route = FlowRoute(self.navigation, key, goal_cells, start)
+        else:
+            route = PathRoute(self.navigation, key, goal_cells, start)
+        return route if route.reachable else None
+        
+    def visible_villagers(self) -> List[Villager]:
+        # Names, HP bars and speech bubbles stick out past the sprite, so look a little beyond the view.
+        view = self.camera.rect.inflate(200, 160)
+        numpy_sim = self.get_numpy_sim()
+        if numpy_sim:
+            visible = numpy_sim.villagers_in_rect(view)
+        else:
+            visible = [entity for entity in self.entity_index.query(view) if isinstance(entity, Villager)]
+        visible.sort(key=lambda villager: (villager.y, villager.x))
+        return visible
+        
+    def villager_changed(self, villager):
+        self.scheduler.schedule(villager, self.world_ticks + 1)
+        self.prefetcher.discard(villager)
+        numpy_sim = self.get_numpy_sim()
+        if numpy_sim:
+            numpy_sim.pull(villager)
+            
+    def villager_in_front(self) -> Optional[Villager]:
         front_x, front_y = self.player.get_front_position()
         front_rect = pygame.Rect(front_x, front_y, 32, 32)
+        numpy_sim = self.get_numpy_sim()
+        if numpy_sim:
+            return numpy_sim.villager_in_rect(front_rect, self.player.sprite.rect.center)
+        return self.entity_index.nearest(
+            front_rect,
+            self.player.sprite.rect.center,
+            lambda entity: isinstance(entity, Villager) and entity.hp > 0
+        )
         
-        for villager in self.villagers:
-            if villager.hp > 0 and front_rect.colliderect(villager.sprite.rect):
-                villager.take_damage()
-                return True
+    def handle_talk(self):
+        villager = self.villager_in_front()
+        if villager:
+            self.dialog_box.show(villager)
+            self.show_greeting(villager)
+            return True
+        return False
+        
+    def update_prefetch(self):
+        if SPECULATIVE_GREETINGS and self.world_ticks % PREFETCH_CHECK_TICKS == 0:
+            self.prefetcher.update(self.villager_in_front())
+            
+    def show_greeting(self, villager):
+        greeting = self.prefetcher.take(villager)
+        if greeting:
+            self.dialog_box.response_text = greeting
+            return
+        # Still being written: show what there is so far and stream in the rest.
+        request, text = self.prefetcher.claim(villager, self._on_greeting, self._on_llm_token)
+        if request:
+            self.dialog_box.set_pending(request)
+            if text:
+                self.dialog_box.append_response(text)
+                
+    def _on_greeting(self, request):
+        if self.dialog_box.pending_request is request:
+            self.dialog_box.pending_request = None
+            if request.result is None:
+                self.dialog_box.response_text = NO_RESPONSE_LINE
+            elif request.result and not LMStudioAPI.is_fallback(request.result) and not self.dialog_box.response_text:
+                self.dialog_box.response_text = request.result
+                
+    def handle_attack(self):
+        villager = self.villager_in_front()
+        if villager:
+            villager.take_damage()
+            self.villager_changed(villager)
+            return True
         return False
         
     def process_dialog_input(self):
         if self.dialog_box.current_villager and self.dialog_box.input_text.strip():
             villager = self.dialog_box.current_villager
             user_input = self.dialog_box.input_text.strip()
+            self.dialog_box.cancel_pending()
             
             villager.add_memory(f"Player said: {user_input}")
             
-            if "follow me" in user_input.lower():
+            with self.profiler.section("dialog.intent"):
+                intent = self.intents.match(user_input, addressee=villager.name)
+            action, target = intent or (None, None)
+            
+            if action == "follow":
                 villager.following_player = True
                 villager.current_task = None
+                villager.route = None
                 villager.add_memory("Started following the player")
                 self.dialog_box.response_text = "Okay, I'll follow you!"
                 
-            elif "stop following" in user_input.lower():
+            elif action == "stop":
                 villager.following_player = False
                 villager.add_memory("Stopped following the player")
                 self.dialog_box.response_text = "Alright, I'll stay here."
                 
-            elif "go to house" in user_input.lower():
-                house_num = None
-                for i in range(1, 4):
-                    if f"house {i}" in user_input.lower():
-                        house_num = i
-                        break
-                        
-                if house_num:
-                    house = self.houses[house_num - 1]
-                    villager.current_task = f"go to house {house_num}"
-                    villager.target_pos = (house.x + house.width//2, house.y + house.height//2)
+            elif action == "go_to":
+                place = target.label.lower()
+                route = self.plan_route(villager, target)
+                if route:
+                    villager.current_task = f"go to {place}"
+                    villager.target_pos = (target.x + target.width//2, target.y + target.height//2)
+                    villager.route = route
                     villager.following_player = False
-                    villager.add_memory(f"Ordered to go to house {house_num}")
-                    self.dialog_box.response_text = f"I'll head to house {house_num}!"
+                    villager.add_memory(f"Ordered to go to {place}")
+                    self.dialog_box.response_text = f"I'll head to {place}!"
                 else:
-                    context = villager.get_context()
-                    self.dialog_box.response_text = self.ai_api.get_response(user_input, context)
-                    
-            elif "attack" in user_input.lower():
-                target_name = None
-                for v in self.villagers:
-                    if v.name.lower() in user_input.lower() and v != villager:
-                        target_name = v.name
-                        break
-                        
-                if target_name:
-                    villager.add_memory(f"Ordered to attack {target_name}")
-                    self.dialog_box.response_text = f"I... I can't attack {target_name}. That's not right!"
-                else:
-                    context = villager.get_context()
-                    self.dialog_box.response_text = self.ai_api.get_response(user_input, context)
+                    villager.add_memory(f"Couldn't find a way to {place}")
+                    self.dialog_box.response_text = f"I don't know how to get to {place} from here."
                     
+            elif action == "attack":
+                villager.add_memory(f"Ordered to attack {target}")
+                self.dialog_box.response_text = f"I... I can't attack {target}. That's not right!"
+                
             else:
-                context = villager.get_context()
-                self.dialog_box.response_text = self.ai_api.get_response(user_input, context)
+                self._ask_villager(villager, user_input)
                 
+            self.villager_changed(villager)
             self.dialog_box.input_text = ""
             
-    def run(self):
-        running = True
+    def _ask_villager(self, villager, user_input: str):
+        cache_key = self.response_cache.make_key(villager.name, user_input, villager.get_context_fields())
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.dialog_box.response_text = cached
+            return
+            
+        context = villager.get_context(user_input)
+        request = self.llm_pipeline.submit(
+            user_input,
+            context,
+            on_done=self._on_llm_response,
+            villager=villager,
+            stream=LLM_STREAMING,
+            on_token=self._on_llm_token
+        )
+        request.cache_key = cache_key
+        self.dialog_box.set_pending(request)
         
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                    
-                elif event.type == pygame.KEYDOWN:
-                    if self.dialog_box.active:
-                        if event.key == pygame.K_ESCAPE:
-                            self.dialog_box.hide()
-                        elif event.key == pygame.K_RETURN:
-                            self.process_dialog_input()
-                        elif event.key == pygame.K_BACKSPACE:
-                            self.dialog_box.remove_char()
-                        else:
-                            if event.unicode.isprintable():
-                                self.dialog_box.add_char(event.unicode)
-                    else:
-                        if event.key == pygame.K_e:
-                            self.handle_talk()
-                        elif event.key == pygame.K_p:
-                            self.handle_attack()
-                            
-            if not self.dialog_box.active:
-                keys = pygame.key.get_pressed()
-                self.player.update(keys)
+    def _on_llm_token(self, request, token: str):
+        if self.dialog_box.pending_request is request:
+            self.dialog_box.append_response(token)
+            
+    def _on_llm_complete(self, request):
+        # Every model call is timed here, player dialog and background work alike;
+        # the per-class samples keep slow chatter from hiding in the player's numbers.
+        name = PRIORITY_NAMES[request.priority]
+        if request.finished_at is not None:
+            latency = request.finished_at - request.submitted_at
+            self.profiler.sample("llm.latency", latency)
+            self.profiler.sample(f"llm.latency.{name}", latency)
+        if request.time_to_first_word is not None:
+            self.profiler.sample("llm.time_to_first_word", request.time_to_first_word)
+        self.profiler.count("llm.requests")
+        if request.result is None or LMStudioAPI.is_fallback(request.result):
+            self.profiler.count("llm.failures")
+            self.profiler.count(f"llm.failures.{name}")
+            
+    def _on_llm_response(self, request):
+        # Only a reply that was read to its end goes in the cache.
+        if request.complete and request.result and not LMStudioAPI.is_fallback(request.result):
+            self.response_cache.put(request.cache_key, request.result)
+            
+        if self.dialog_box.pending_request is request:
+            self.dialog_box.pending_request = None
+            # A reply that broke off replaces whatever part of it had streamed in.
+            if request.result is None:
+                self.dialog_box.response_text = NO_RESPONSE_LINE
+            elif not self.dialog_box.response_text:
+                self.dialog_box.response_text = request.result
                 
-                for villager in self.villagers:
-                    villager.update(self.player, self.villagers, self.obstacles)
-                    
-            self.screen.fill(GREEN)
+    def process_villager_events(self):
+        events = self.villager_events[:]
+        self.villager_events.clear()
+        for villager, event in events:
+            if villager.hp <= 0:
+                continue
+            if event == "attacked":
+                prompt = f"The player just hit you! You have {villager.hp} HP left. React out loud in one short sentence."
+            else:
+                prompt = "You are badly hurt and running away from the player. Cry out in one short sentence."
+            self.llm_pipeline.submit(
+                prompt,
+                villager.get_context(),
+                on_done=self._on_villager_line,
+                villager=villager,
+                priority=PRIORITY_EVENT,
+                coalesce_key=(villager, "react"),
+                batch_key="react",
+                deadline=LLM_EVENT_DEADLINE
+            )
             
-            for house in self.houses:
-                house.draw(self.screen, self.font)
+    def update_chatter(self):
+        if not AMBIENT_CHATTER or self.chatter_rng.random() >= CHATTER_CHANCE:
+            return
+        # Backpressure: ambient chatter is the first thing to go when the model falls behind.
+        if self.llm_pipeline.pressure >= CHATTER_MAX_PRESSURE:
+            return
+        speaker = self.chatter_rng.choice(self.villagers)
+        if speaker.hp <= 0 or speaker.fleeing:
+            return
+        listener = self.villager_near(speaker, CHATTER_RADIUS)
+        if listener is None:
+            return
+        self.llm_pipeline.submit(
+            f"You run into {listener.name} while walking through the village. Say one short line to them.",
+            speaker.get_context(),
+            on_done=lambda request: self._on_villager_line(request, listener),
+            villager=speaker,
+            priority=PRIORITY_AMBIENT,
+            coalesce_key=(speaker, "chatter"),
+            batch_key="chatter",
+            deadline=LLM_CHATTER_DEADLINE
+        )
+        
+    def villager_near(self, villager, radius: int) -> Optional[Villager]:
+        area = villager.sprite.rect.inflate(radius * 2, radius * 2)
+        numpy_sim = self.get_numpy_sim()
+        if numpy_sim:
+            return numpy_sim.villager_in_rect(area, villager.sprite.rect.center, exclude=villager)
+        return self.entity_index.nearest(
+            area,
+            villager.sprite.rect.center,
+            lambda entity: isinstance(entity, Villager) and entity is not villager and entity.hp > 0
+        )
+        
+    def _on_villager_line(self, request, listener=None):
+        villager = request.villager
+        text = request.result
+        if not text or LMStudioAPI.is_fallback(text) or villager.hp <= 0:
+            return
+        villager.say(text)
+        if listener:
+            villager.add_memory(f"Told {listener.name}: {text}")
+            listener.add_memory(f"{villager.name} told me: {text}")
+            
+    def handle_events(self, events) -> bool:
+        running = True
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+                
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.renderer.full_redraw = True
                 
+            elif event.type == pygame.KEYDOWN:
+                if self.dialog_box.active:
+                    if event.key == pygame.K_ESCAPE:
+                        self.dialog_box.hide()
+                    elif event.key == pygame.K_RETURN:
+                        self.process_dialog_input()
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.dialog_box.remove_char()
+                    elif event.key == pygame.K_UP:
+                        self.dialog_box.scroll_by(-1)
+                    elif event.key == pygame.K_DOWN:
+                        self.dialog_box.scroll_by(1)
+                    else:
+                        if event.unicode.isprintable():
+                            self.dialog_box.add_char(event.unicode)
+                elif event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                    self.renderer.full_redraw = True
+                elif event.key == pygame.K_F5:
+                    self.save_game()
+                else:
+                    if event.key == pygame.K_e:
+                        self.handle_talk()
+                    elif event.key == pygame.K_p:
+                        self.handle_attack()
+                        
+        return running
+        
+    def update(self, keys):
+        if not self.dialog_box.active:
+            with self.profiler.section("update.player"):
+                self.player.update(keys, self.obstacle_index)
+                self.entity_index.update(self.player, self.player.sprite.rect)
+            with self.profiler.section("update.world"):
+                if self.camera.follow(self.player.x, self.player.y, self.player.width, self.player.height):
+                    self.renderer.invalidate()
+                    self.update_world()
+                self.world_ticks += 1
+                if self.world_ticks % WORLD_SWEEP_TICKS == 0:
+                    self.sweep_world()
+                if self.world_ticks % int(AUTOSAVE_INTERVAL * SIM_HZ) == 0:
+                    self.save_game()
+            with self.profiler.section("update.villagers"):
+                self.update_villagers()
+            self.process_villager_events()
+            self.update_chatter()
+            self.update_prefetch()
+            
+    def chunk_background(self, key) -> Optional[pygame.Surface]:
+        chunk = self.world.chunks.get(key)
+        if chunk is None:
+            return None
+        if chunk.surface is None:
+            chunk.surface = pygame.Surface(chunk.rect.size).convert()
+            chunk.surface.fill(GREEN)
+            for house in self.houses:
+                # Inflated so a label hanging below a house in the next chunk is drawn too.
+                if house.rect.inflate(40, 40).colliderect(chunk.rect):
+                    house.draw(chunk.surface, self.font, chunk.rect.topleft)
             for tree in self.trees:
-                tree.draw(self.screen)
+                if tree.rect.colliderect(chunk.rect):
+                    tree.draw(chunk.surface, chunk.rect.topleft)
+        return chunk.surface
+        
+    def draw_static(self, surface):
+        for key in self.world.keys_in(self.camera.rect):
+            background = self.chunk_background(key)
+            if background:
+                surface.blit(background, self.camera.to_screen(self.world.chunk_rect(key)))
                 
-            self.player.draw(self.screen)
+        instructions = [
+            "Arrow Keys/WASD: Move",
+            "E: Talk to villager in front",
+            "P: Attack villager in front",
+            "Commands: 'follow me', 'stop following', 'go to house X'"
+        ]
+        
+        for i, instruction in enumerate(instructions):
+            text_surface = text_cache.render(self.small_font, instruction, True, BLACK)
+            surface.blit(text_surface, (10, 10 + i * 20))
             
-            for villager in self.villagers:
-                villager.draw(self.screen, self.small_font)
+    def draw(self, alpha: float = 1.0):
+        if self.dialog_box.active:
+            # The world is paused, so there is nothing to interpolate toward.
+            alpha = 1.0
+            
+        with self.profiler.section("draw.background"):
+            self.renderer.begin_frame(self.draw_static)
+            
+        with self.profiler.section("draw.entities"):
+            offset = self.camera.offset
+            self.renderer.mark(self.player.draw(self.screen, alpha, offset))
+            
+            for villager in self.visible_villagers():
+                self.renderer.mark(villager.draw(self.screen, self.small_font, alpha, offset))
+                
+        with self.profiler.section("draw.dialog"):
+            self.renderer.mark(self.dialog_box.draw(self.screen, self.font))
+            
+        self.renderer.mark(self.profiler.draw_overlay(self.screen, self.small_font))
+        
+    def present(self):
+        with self.profiler.section("present"):
+            self.renderer.present()
+            
+    def shutdown(self):
+        self.llm_pipeline.shutdown()
+        self.response_cache.save()
+        if self.saver:
+            self.save_game(wait=True)
+            self.saver.shutdown()
+        if self.profiler.export_path:
+            self.profiler.export(self.profiler.export_path)
+            
+    def run(self):
+        running = True
+        sim_dt = 1.0 / SIM_HZ
+        accumulator = 0.0
+        previous = time.perf_counter()
+        
+        while running:
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            
+            with self.profiler.section("events"):
+                self.llm_pipeline.poll()
+                running = self.handle_events(pygame.event.get())
                 
-            self.dialog_box.draw(self.screen, self.font)
-            
-            instructions = [
-                "Arrow Keys/WASD: Move",
-                "E: Talk to villager in front",
-                "P: Attack villager in front",
-                "Commands: 'follow me', 'stop following', 'go to house X'"
-            ]
-            
-            for i, instruction in enumerate(instructions):
-                text_surface = self.small_font.render(instruction, True, BLACK)
-                self.screen.blit(text_surface, (10, 10 + i * 20))
+            keys = pygame.key.get_pressed()
+            steps = 0
+            while accumulator >= sim_dt and steps < MAX_SIM_STEPS_PER_FRAME:
+                self.update(keys)
+                accumulator -= sim_dt
+                steps += 1
+            if accumulator >= sim_dt:
+                # Too far behind to catch up: drop the backlog instead of spiralling.
+                accumulator = 0.0
                 
-            pygame.display.flip()
+            self.draw(accumulator / sim_dt)
+            self.present()
             self.clock.tick(FPS)
+            self.profiler.end_frame(time.perf_counter() - now)
             
+        self.shutdown()
         pygame.quit()
 
 if __name__ == "__main__":
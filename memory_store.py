@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import math
+import re
+import time
+from array import array
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+
+WORD = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have i if in is it its me my of on or so that the this to "
+    "was were what when where who will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text; close enough for budgeting.
+    return len(text) // 4 + 1
+
+def summarize_episode(texts: List[str], max_chars: int = 160) -> str:
+    # Extractive rollup: repeated events are collapsed into a count and kept in order.
+    counts = Counter(texts)
+    parts = []
+    for text in dict.fromkeys(texts):
+        parts.append(f"{text} (x{counts[text]})" if counts[text] > 1 else text)
+    summary = "; ".join(parts)
+    if len(summary) > max_chars:
+        summary = summary[:max_chars - 3].rstrip() + "..."
+    return summary
+
+class InvertedIndex:
+    # Okapi BM25 over short documents; postings are arrays of document ids.
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = array("H")
+        self.total_length = 0
+        self.packed = None
+        
+    def unpack(self):
+        # An index restored from a save stays as one term string and two flat
+        # arrays until it is first searched or added to.
+        # The autosave thread reads `packed` and then `postings`, so the
+        # postings are swapped in whole before `packed` is cleared.
+        terms, counts, postings = self.packed
+        if terms:
+            ends = itertools.accumulate(counts)
+            self.postings = {
+                term: postings[end - count:end] for term, count, end in zip(terms.split("\n"), counts, ends)
+            }
+        self.packed = None
+            
+    def add(self, tokens: List[str]) -> int:
+        if self.packed:
+            self.unpack()
+        doc = len(self.lengths)
+        length = min(len(tokens), 65535)
+        self.lengths.append(length)
+        self.total_length += length
+        for term in set(tokens):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("I")
+            postings.append(doc)
+        return doc
+        
+    def search(self, terms: List[str], limit: int) -> List[Tuple[float, int]]:
+        count = len(self.lengths)
+        if not count or not terms:
+            return []
+        if self.packed:
+            self.unpack()
+        average_length = self.total_length / count or 1.0
+        matched = [(term, query_count, self.postings[term]) for term, query_count in Counter(terms).items()
+                   if term in self.postings]
+        # Terms in over half the documents add almost nothing to the score but
+        # cost a pass over most of the postings, so skip them when rarer terms exist.
+        rare = [entry for entry in matched if len(entry[2]) * 2 <= count]
+        scores = {}
+        for term, query_count, postings in rare or matched:
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc in postings:
+                # Memories are a sentence long, so a term occurring once is the common case.
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + query_count * idf * (self.k1 + 1) / (1 + norm)
+        return heapq.nlargest(limit, ((score, doc) for doc, score in scores.items()))
+
+class MemoryStore:
+    # Full history lives in one append-only UTF-8 buffer with offset and
+    # timestamp arrays, so thousands of entries cost little more than their text.
+    # Everything past the recent window is also rolled up into short episode
+    # summaries that stand in for old history when building prompts.
+    def __init__(self, recent_window: int = 20, episode_size: int = 10,
+                 summarize: Callable[[List[str]], str] = summarize_episode):
+        self.recent_window = recent_window
+        self.episode_size = episode_size
+        self.summarize = summarize
+        self.data = bytearray()
+        self.offsets = array("I", [0])
+        self.times = array("d")
+        self.index = InvertedIndex()
+        self.rollups = []
+        self.rollup_index = InvertedIndex()
+        self.rolled_up_to = 0
+        
+    def __len__(self) -> int:
+        return len(self.times)
+        
+    def __bool__(self) -> bool:
+        return len(self.times) > 0
+        
+    def add(self, text: str, timestamp: Optional[float] = None):
+        self.data += text.encode("utf-8")
+        self.offsets.append(len(self.data))
+        self.times.append(time.time() if timestamp is None else timestamp)
+        self.index.add(tokenize(text))
+        if len(self) - self.rolled_up_to >= self.recent_window + self.episode_size:
+            self._roll_up()
+            
+    def text(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+        
+    def format(self, i: int) -> str:
+        return f"{time.strftime('%H:%M', time.localtime(self.times[i]))} - {self.text(i)}"
+        
+    def _roll_up(self):
+        start, end = self.rolled_up_to, self.rolled_up_to + self.episode_size
+        summary = self.summarize([self.text(i) for i in range(start, end)])
+        span = f"{time.strftime('%H:%M', time.localtime(self.times[start]))}-{time.strftime('%H:%M', time.localtime(self.times[end - 1]))}"
+        self.rollups.append(f"{span} - {summary}")
+        self.rollup_index.add(tokenize(summary))
+        self.rolled_up_to = end
+        
+    def recent(self, count: int) -> List[int]:
+        return list(range(max(0, len(self) - count), len(self)))
+        
+    def search(self, query: str, limit: int = 3) -> List[int]:
+        return [doc for _, doc in self.index.search(tokenize(query), limit)]
+        
+    def build_context(self, query: str = "", budget: int = 160, recent: int = 3, relevant: int = 3) -> str:
+        # Most recent first, then whatever matches the query, then episode
+        # rollups newest first, each only while it still fits the token budget.
+        remaining = budget
+        
+        def take(candidates):
+            nonlocal remaining
+            kept = []
+            for order, line in candidates:
+                cost = estimate_tokens(line)
+                if cost > remaining:
+                    break
+                remaining -= cost
+                kept.append((order, line))
+            return [line for _, line in sorted(kept)]
+            
+        recent_ids = self.recent(recent)
+        recent_lines = take((i, self.format(i)) for i in reversed(recent_ids))
+        matches = [i for i in self.search(query, relevant + recent) if i not in recent_ids][:relevant] if query else []
+        relevant_lines = take((i, self.format(i)) for i in matches)
+        # Rollups that match the query jump the queue ahead of merely recent ones.
+        hits = [doc for _, doc in self.rollup_index.search(tokenize(query), relevant)] if query else []
+        newest = (doc for doc in range(len(self.rollups) - 1, -1, -1) if doc not in hits)
+        rollup_lines = take((doc, self.rollups[doc]) for doc in itertools.chain(hits, newest))
+        
+        sections = []
+        if rollup_lines:
+            sections.append("Earlier:\n" + "\n".join(rollup_lines))
+        if relevant_lines:
+            sections.append("Related memories:\n" + "\n".join(relevant_lines))
+        if recent_lines:
+            sections.append("Recent memories:\n" + "\n".join(recent_lines))
+        return "\n".join(sections)
@@ -0,0 +1,306 @@
+import heapq
+from collections import OrderedDict, deque
+from typing import Iterable, List, Optional, Tuple
+
+import pygame
+
+NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+class NavGrid:
+    # Cells describe where an agent's top-left corner may stand, so obstacles
+    # are inflated by the agent size when they are stamped into the grid. A
+    # walkable cell is collision-free anywhere inside it, which lets agents
+    # walk between adjacent walkable cells with plain axis-aligned steps.
+    def __init__(self, width: int, height: int, cell_size: int = 16, agent_size: Tuple[int, int] = (32, 32),
+                 max_flow_fields: int = 32, flow_margin: int = 32, change_log: int = 256):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.agent_width, self.agent_height = agent_size
+        self.cols = (width + cell_size - 1) // cell_size
+        self.rows = (height + cell_size - 1) // cell_size
+        self.blockers = [0] * (self.cols * self.rows)
+        self.obstacles = {}
+        self.version = 0
+        self.blocked_log = deque(maxlen=change_log)
+        self.log_start = 0
+        self.max_flow_fields = max_flow_fields
+        self.flow_margin = flow_margin
+        self.flow_fields = OrderedDict()
+        for row in range(self.rows):
+            for col in range(self.cols):
+                if not self._in_bounds(col, row):
+                    self.blockers[row * self.cols + col] += 1
+                    
+    def _in_bounds(self, col: int, row: int) -> bool:
+        size = self.cell_size
+        return ((col + 1) * size - 1 <= self.width - self.agent_width
+                and (row + 1) * size - 1 <= self.height - self.agent_height)
+                
+    def _cells_blocked_by(self, rect) -> Iterable[int]:
+        left, top, width, height = rect
+        size = self.cell_size
+        col_min = max(0, -((self.agent_width - left - 2 + size) // size))
+        row_min = max(0, -((self.agent_height - top - 2 + size) // size))
+        col_max = min(self.cols - 1, (left + width - 1) // size)
+        row_max = min(self.rows - 1, (top + height - 1) // size)
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                yield row * self.cols + col
+                
+    def add_obstacle(self, rect):
+        rect = pygame.Rect(rect)
+        key = (rect.x, rect.y, rect.w, rect.h)
+        self.obstacles[key] = self.obstacles.get(key, 0) + 1
+        blocked = []
+        for cell in self._cells_blocked_by(key):
+            if not self.blockers[cell]:
+                blocked.append(cell)
+            self.blockers[cell] += 1
+        self._changed(blocked, True)
+        
+    def remove_obstacle(self, rect):
+        rect = pygame.Rect(rect)
+        key = (rect.x, rect.y, rect.w, rect.h)
+        if not self.obstacles.get(key):
+            return
+        self.obstacles[key] -= 1
+        if not self.obstacles[key]:
+            del self.obstacles[key]
+        opened = []
+        for cell in self._cells_blocked_by(key):
+            self.blockers[cell] -= 1
+            if not self.blockers[cell]:
+                opened.append(cell)
+        self._changed(opened, False)
+        
+    def _changed(self, cells: List[int], blocked: bool):
+        # Only what the change can reach is thrown away: flow fields that
+        # covered (or, for a removed obstacle, bordered) the cells, and, via
+        # the log, A* routes whose remaining path runs through newly blocked
+        # cells. A chunk streaming in across the map leaves both alone.
+        if not cells:
+            return
+        self.version += 1
+        if blocked:
+            if len(self.blocked_log) == self.blocked_log.maxlen:
+                self.log_start = self.blocked_log[0][0]
+            self.blocked_log.append((self.version, frozenset(cells)))
+        for key in [key for key, field in self.flow_fields.items() if field.affected_by(cells, blocked)]:
+            del self.flow_fields[key]
+            
+    def blocked_since(self, version: int) -> Optional[set]:
+        # Cells blocked after `version`, or None once the log no longer goes back that far.
+        if version < self.log_start:
+            return None
+        cells = set()
+        for changed, blocked in reversed(self.blocked_log):
+            if changed <= version:
+                break
+            cells |= blocked
+        return cells
+        
+    def walkable(self, cell: int) -> bool:
+        return self.blockers[cell] == 0
+        
+    def cell_at(self, x: int, y: int) -> int:
+        col = min(self.cols - 1, max(0, x // self.cell_size))
+        row = min(self.rows - 1, max(0, y // self.cell_size))
+        return row * self.cols + col
+        
+    def cell_origin(self, cell: int) -> Tuple[int, int]:
+        return (cell % self.cols) * self.cell_size, (cell // self.cols) * self.cell_size
+        
+    def neighbors(self, cell: int) -> Iterable[int]:
+        col, row = cell % self.cols, cell // self.cols
+        for dc, dr in NEIGHBORS:
+            c, r = col + dc, row + dr
+            if 0 <= c < self.cols and 0 <= r < self.rows:
+                neighbor = r * self.cols + c
+                if self.blockers[neighbor] == 0:
+                    yield neighbor
+                    
+    def cells_near(self, rect, margin: int) -> frozenset:
+        area = pygame.Rect(rect).inflate(margin * 2, margin * 2)
+        return frozenset(cell for cell in self._cells_blocked_by(area) if self.blockers[cell] == 0)
+        
+    def find_path(self, start: Tuple[int, int], goal_cells: frozenset) -> Optional[List[Tuple[int, int]]]:
+        if not goal_cells:
+            return None
+        start_cell = self.cell_at(*start)
+        cols = self.cols
+        goal_cols = [cell % cols for cell in goal_cells]
+        goal_rows = [cell // cols for cell in goal_cells]
+        min_col, max_col, min_row, max_row = min(goal_cols), max(goal_cols), min(goal_rows), max(goal_rows)
+        
+        def heuristic(cell):
+            col, row = cell % cols, cell // cols
+            return max(min_col - col, 0, col - max_col) + max(min_row - row, 0, row - max_row)
+            
+        came_from = {start_cell: None}
+        cost = {start_cell: 0}
+        frontier = [(heuristic(start_cell), 0, start_cell)]
+        while frontier:
+            _, g, cell = heapq.heappop(frontier)
+            if cell in goal_cells:
+                path = []
+                while cell is not None:
+                    path.append(self.cell_origin(cell))
+                    cell = came_from[cell]
+                path.reverse()
+                return path[1:]
+            if g > cost[cell]:
+                continue
+            for neighbor in self.neighbors(cell):
+                new_cost = g + 1
+                if new_cost < cost.get(neighbor, new_cost + 1):
+                    cost[neighbor] = new_cost
+                    came_from[neighbor] = cell
+                    heapq.heappush(frontier, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        return None
+        
+    def goal_distance(self, cell: int, goal_cells: frozenset) -> int:
+        # Manhattan distance in cells to the goal's bounding box.
+        cols = self.cols
+        col, row = cell % cols, cell // cols
+        goal_cols = [goal % cols for goal in goal_cells]
+        goal_rows = [goal // cols for goal in goal_cells]
+        return (max(min(goal_cols) - col, 0, col - max(goal_cols))
+                + max(min(goal_rows) - row, 0, row - max(goal_rows)))
+                
+    def flow_field(self, key, goal_cells: frozenset, start: Optional[Tuple[int, int]] = None) -> "FlowField":
+        # Fields only spread as far as the agents using them need (twice the
+        # straight-line distance plus `flow_margin` for detours) and are
+        # regrown when someone further out asks.
+        field = self.flow_fields.get(key)
+        if field is not None and (start is None or field.covers(*start)):
+            self.flow_fields.move_to_end(key)
+            return field
+        limit = None
+        if start is not None and goal_cells:
+            limit = 2 * self.goal_distance(self.cell_at(*start), goal_cells) + self.flow_margin
+            if field is not None and field.limit is not None:
+                limit = max(limit, field.limit * 2)
+        field = FlowField(self, goal_cells, limit)
+        while start is not None and not field.covers(*start):
+            field = FlowField(self, goal_cells, field.limit * 2)
+        self.flow_fields[key] = field
+        if len(self.flow_fields) > self.max_flow_fields:
+            self.flow_fields.popitem(last=False)
+        return field
+
+class FlowField:
+    def __init__(self, grid: NavGrid, goal_cells: frozenset, limit: Optional[int] = None):
+        self.grid = grid
+        self.limit = limit
+        self.truncated = False
+        self.distance = [-1] * (grid.cols * grid.rows)
+        queue = deque()
+        for cell in goal_cells:
+            self.distance[cell] = 0
+            queue.append(cell)
+        while queue:
+            cell = queue.popleft()
+            if limit is not None and self.distance[cell] >= limit:
+                self.truncated = True
+                continue
+            for neighbor in grid.neighbors(cell):
+                if self.distance[neighbor] < 0:
+                    self.distance[neighbor] = self.distance[cell] + 1
+                    queue.append(neighbor)
+                    
+    def covers(self, x: int, y: int) -> bool:
+        return not self.truncated or self._best_cell(x, y) is not None
+        
+    def affected_by(self, cells: List[int], blocked: bool) -> bool:
+        # A newly blocked cell matters if the field went through it; a newly
+        # opened one only if it sits next to a cell the field reached, since
+        # any shortcut through it has to enter from there.
+        distance = self.distance
+        if blocked:
+            return any(distance[cell] >= 0 for cell in cells)
+        grid = self.grid
+        for cell in cells:
+            col, row = cell % grid.cols, cell // grid.cols
+            for dc, dr in NEIGHBORS:
+                c, r = col + dc, row + dr
+                if 0 <= c < grid.cols and 0 <= r < grid.rows and distance[r * grid.cols + c] >= 0:
+                    return True
+        return False
+        
+    def reachable(self, x: int, y: int) -> bool:
+        return self._best_cell(x, y) is not None
+        
+    def _best_cell(self, x: int, y: int) -> Optional[int]:
+        grid = self.grid
+        cell = grid.cell_at(x, y)
+        if self.distance[cell] >= 0:
+            return cell
+        # The agent may stand in a conservatively blocked cell right next to
+        # an obstacle; step into whichever neighbouring cell is closest to the goal.
+        col, row = cell % grid.cols, cell // grid.cols
+        best = None
+        for dc in (-1, 0, 1):
+            for dr in (-1, 0, 1):
+                c, r = col + dc, row + dr
+                if 0 <= c < grid.cols and 0 <= r < grid.rows:
+                    neighbor = r * grid.cols + c
+                    if self.distance[neighbor] >= 0 and (best is None or self.distance[neighbor] < self.distance[best]):
+                        best = neighbor
+        return best
+        
+    def next_waypoint(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        grid = self.grid
+        cell = grid.cell_at(x, y)
+        if self.distance[cell] < 0:
+            best = self._best_cell(x, y)
+            return grid.cell_origin(best) if best is not None else None
+        for neighbor in grid.neighbors(cell):
+            if self.distance[neighbor] == self.distance[cell] - 1:
+                return grid.cell_origin(neighbor)
+        return None
+
+class Route:
+    def __init__(self, grid: NavGrid, key, goal_cells: frozenset):
+        self.grid = grid
+        self.key = key
+        self.goal_cells = goal_cells
+        
+    def arrived(self, x: int, y: int) -> bool:
+        return self.grid.cell_at(x, y) in self.goal_cells
+
+class PathRoute(Route):
+    def __init__(self, grid: NavGrid, key, goal_cells: frozenset, start: Tuple[int, int]):
+        super().__init__(grid, key, goal_cells)
+        self.plan(start)
+        
+    def plan(self, start: Tuple[int, int]):
+        self.version = self.grid.version
+        self.waypoints = self.grid.find_path(start, self.goal_cells)
+        
+    @property
+    def reachable(self) -> bool:
+        return self.waypoints is not None
+        
+    def next_waypoint(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        if self.version != self.grid.version:
+            # Only replan if something now blocks the rest of the path.
+            blocked = self.grid.blocked_since(self.version)
+            if blocked is None or any(self.grid.cell_at(*waypoint) in blocked for waypoint in self.waypoints or ()):
+                self.plan((x, y))
+            else:
+                self.version = self.grid.version
+        if not self.waypoints:
+            return None
+        while self.waypoints and self.waypoints[0] == (x, y):
+            self.waypoints.pop(0)
+        return self.waypoints[0] if self.waypoints else None
+
+class FlowRoute(Route):
+    def __init__(self, grid: NavGrid, key, goal_cells: frozenset, start: Tuple[int, int]):
+        super().__init__(grid, key, goal_cells)
+        self.reachable = grid.flow_field(key, goal_cells, start).reachable(*start)
+        
+    def next_waypoint(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        # Looked up every time so a changed grid transparently yields a fresh shared field.
+        return self.grid.flow_field(self.key, self.goal_cells, (x, y)).next_waypoint(x, y)
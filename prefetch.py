@@ -0,0 +1,147 @@
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from llm_broker import PRIORITY_SPECULATIVE
+
+class GreetingPrefetcher:
+    # Guesses that the player is about to talk to the villager they are
+    # standing in front of and asks for a greeting ahead of time. Besides
+    # having a line ready the moment the dialog opens, the request puts that
+    # villager's context in front of the model so the first real reply starts
+    # warm. Guesses are capped (one in flight, a per-minute budget) and
+    # cancelled as soon as the player turns away.
+    def __init__(self, broker, prompt: str, context: Callable, valid: Callable[[str], bool] = bool,
+                 dwell: int = 3, max_pending: int = 1, max_per_minute: int = 6, ttl: float = 60.0,
+                 deadline: Optional[float] = None, max_pressure: float = 0.5):
+        self.broker = broker
+        self.prompt = prompt
+        self.context = context
+        self.valid = valid
+        self.dwell = dwell
+        self.max_pending = max_pending
+        self.max_per_minute = max_per_minute
+        self.ttl = ttl
+        self.deadline = deadline
+        self.max_pressure = max_pressure
+        self.target = None
+        self.seen = 0
+        self.used = False
+        self.pending = {}
+        self.streamed = {}
+        self.ready = {}
+        self.submitted = deque()
+        self.counters = {
+            "requests": 0,
+            "hits": 0,
+            "claimed": 0,
+            "cancelled": 0,
+            "wasted": 0,
+            "capped": 0
+        }
+        
+    def update(self, villager):
+        # Called periodically with whoever is in front of the player (or None).
+        now = time.monotonic()
+        self._prune(now)
+        if villager is not self.target:
+            for other in [other for other in self.pending if other is not villager]:
+                self._forget(other).cancel()
+                self.counters["cancelled"] += 1
+                self.counters["wasted"] += 1
+            self.target = villager
+            self.seen = 0
+            self.used = False
+        # Once the player has talked to someone, standing there doesn't earn them another greeting.
+        if villager is None or self.used or villager in self.pending or villager in self.ready:
+            return
+        # Only players who stop in front of someone count; walking past doesn't.
+        self.seen += 1
+        if self.seen < self.dwell or len(self.pending) >= self.max_pending:
+            return
+        while self.submitted and now - self.submitted[0] > 60.0:
+            self.submitted.popleft()
+        if len(self.submitted) >= self.max_per_minute or self.broker.pressure >= self.max_pressure:
+            self.counters["capped"] += 1
+            return
+            
+        request = self.broker.submit(
+            self.prompt,
+            self.context(villager),
+            on_done=self._on_done,
+            villager=villager,
+            stream=True,
+            on_token=self._on_token,
+            priority=PRIORITY_SPECULATIVE,
+            coalesce_key=(villager, "greeting"),
+            deadline=self.deadline
+        )
+        if request is None:
+            return
+        self.pending[villager] = request
+        self.submitted.append(now)
+        self.counters["requests"] += 1
+        
+    def _prune(self, now: float):
+        for villager, (_, created) in list(self.ready.items()):
+            if now - created > self.ttl:
+                del self.ready[villager]
+                self.counters["wasted"] += 1
+                
+    def _forget(self, villager):
+        request = self.pending.pop(villager)
+        self.streamed.pop(request, None)
+        return request
+        
+    def _on_token(self, request, token: str):
+        # Kept so a greeting claimed halfway through can show what it has so far.
+        if self.pending.get(request.villager) is request:
+            self.streamed.setdefault(request, []).append(token)
+            
+    def _on_done(self, request):
+        villager = request.villager
+        if self.pending.get(villager) is not request:
+            return
+        self._forget(villager)
+        if request.result and self.valid(request.result):
+            self.ready[villager] = (request.result, time.monotonic())
+        else:
+            self.counters["wasted"] += 1
+            
+    def take(self, villager) -> Optional[str]:
+        self.used = True
+        entry = self.ready.pop(villager, None)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        self.counters["hits"] += 1
+        return entry[0]
+        
+    def claim(self, villager, on_done: Callable, on_token: Optional[Callable] = None):
+        # Hands a greeting that is still being generated over to the dialog,
+        # along with the text streamed so far; the rest arrives via on_token.
+        self.used = True
+        if villager not in self.pending:
+            return None, ""
+        request = self.pending[villager]
+        text = "".join(self.streamed.get(request, ()))
+        self._forget(villager)
+        request.on_done = on_done
+        request.on_token = on_token
+        # The player is waiting on it now, so it must not expire or wait behind chatter.
+        self.broker.promote(request)
+        self.counters["claimed"] += 1
+        return request, text
+        
+    def discard(self, villager):
+        # Something happened to the villager, so a prepared greeting may no longer fit.
+        if villager in self.pending:
+            self._forget(villager).cancel()
+            self.counters["wasted"] += 1
+        if self.ready.pop(villager, None) is not None:
+            self.counters["wasted"] += 1
+            
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        stats["pending"] = len(self.pending)
+        stats["ready"] = len(self.ready)
+        return stats
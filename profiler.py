@@ -0,0 +1,162 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+import pygame
+
+NULL_SECTION = nullcontext()
+
+class RollingHistogram:
+    def __init__(self, window: int = 600):
+        self.samples = deque(maxlen=window)
+        self.total_count = 0
+        
+    def add(self, value: float):
+        self.samples.append(value)
+        self.total_count += 1
+        
+    def percentile(self, ordered, fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+        
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"count": self.total_count}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.total_count,
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": self.percentile(ordered, 0.50) * 1000,
+            "p95_ms": self.percentile(ordered, 0.95) * 1000,
+            "p99_ms": self.percentile(ordered, 0.99) * 1000,
+            "max_ms": ordered[-1] * 1000
+        }
+
+class Section:
+    __slots__ = ("profiler", "name", "started")
+    
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        
+    def __enter__(self):
+        self.started = time.perf_counter()
+        
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.started)
+
+class Profiler:
+    def __init__(self, enabled: bool = False, window: int = 600, export_path: Optional[str] = None,
+                 export_interval: float = 10.0):
+        self.enabled = enabled
+        self.show_overlay = False
+        self.window = window
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.last_export = time.monotonic()
+        self.histograms: Dict[str, RollingHistogram] = {}
+        self.frame_totals: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, Callable[[], dict]] = {}
+        self.overlay_gauges = []
+        
+    def toggle(self):
+        # Only shows or hides the overlay; whether timings are sampled is up to `enabled`.
+        self.show_overlay = not self.show_overlay
+        
+    def section(self, name: str):
+        if not self.enabled:
+            return NULL_SECTION
+        return Section(self, name)
+        
+    def add(self, name: str, seconds: float):
+        # Accumulates within the current frame; end_frame() turns the total into one sample.
+        self.frame_totals[name] = self.frame_totals.get(name, 0.0) + seconds
+        
+    def sample(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = RollingHistogram(self.window)
+        histogram.add(seconds)
+        
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+        
+    def add_gauge(self, name: str, read: Callable[[], dict], overlay_keys=()):
+        self.gauges[name] = read
+        self.overlay_gauges.extend((name, key) for key in overlay_keys)
+        
+    def end_frame(self, frame_seconds: float):
+        if not self.enabled:
+            return
+        self.sample("frame", frame_seconds)
+        for name, total in self.frame_totals.items():
+            self.sample(name, total)
+        self.frame_totals = {}
+        if self.export_path and time.monotonic() - self.last_export >= self.export_interval:
+            self.export(self.export_path)
+            
+    def summary(self) -> dict:
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "timers": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+            "counters": dict(self.counters),
+            "gauges": {name: read() for name, read in self.gauges.items()}
+        }
+        
+    def export(self, path: str):
+        self.last_export = time.monotonic()
+        summary = self.summary()
+        if path.endswith(".csv"):
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["timestamp", "metric", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+                for name, stats in summary["timers"].items():
+                    writer.writerow([summary["timestamp"], name, stats["count"]] + [
+                        round(stats.get(key, 0.0), 3) for key in ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+                    ])
+                for name, value in summary["counters"].items():
+                    writer.writerow([summary["timestamp"], name, value, "", "", "", "", ""])
+        else:
+            # One JSON object per line, so a session can be appended to and charted later.
+            with open(path, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+                
+    def overlay_lines(self) -> list:
+        lines = []
+        frame = self.histograms.get("frame")
+        if frame and frame.samples:
+            stats = frame.summary()
+            lines.append(f"frame p50 {stats['p50_ms']:.1f} p95 {stats['p95_ms']:.1f} p99 {stats['p99_ms']:.1f} ms "
+                         f"({1000 / stats['mean_ms']:.0f} fps)")
+        for name, histogram in sorted(self.histograms.items()):
+            if name == "frame" or not histogram.samples:
+                continue
+            stats = histogram.summary()
+            lines.append(f"{name}: p50 {stats['p50_ms']:.2f} p95 {stats['p95_ms']:.2f} ms")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value}")
+        for name, key in self.overlay_gauges:
+            lines.append(f"{name}.{key}: {self.gauges[name]().get(key)}")
+        return lines
+        
+    def draw_overlay(self, screen, font) -> Optional[pygame.Rect]:
+        if not self.show_overlay:
+            return None
+        lines = self.overlay_lines() or ["collecting..."]
+        if not self.enabled:
+            lines.insert(0, "sampling off (PROFILER_ENABLED)")
+        line_height = font.get_linesize()
+        width = max(font.size(line)[0] for line in lines) + 12
+        rect = pygame.Rect(screen.get_width() - width - 10, 10, width, line_height * len(lines) + 8)
+        panel = pygame.Surface(rect.size, pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            panel.blit(font.render(line, True, (255, 255, 255)), (6, 4 + i * line_height))
+        screen.blit(panel, rect)
+        return rect
@@ -0,0 +1,46 @@
+from typing import Callable, Optional
+
+import pygame
+
+class DirtyRectRenderer:
+    def __init__(self, screen, background_color, max_dirty_rects: int = 256):
+        self.screen = screen
+        self.background_color = background_color
+        self.max_dirty_rects = max_dirty_rects
+        self.background = None
+        self.dirty = []
+        self.previous_dirty = []
+        self.full_redraw = True
+        
+    def invalidate(self):
+        self.background = None
+        
+    def bake(self, draw_static: Callable):
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(self.background_color)
+        draw_static(self.background)
+        self.full_redraw = True
+        
+    def begin_frame(self, draw_static: Callable):
+        if self.background is None:
+            self.bake(draw_static)
+        if self.full_redraw or len(self.previous_dirty) > self.max_dirty_rects:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            # Only erase what was drawn over the scenery last frame.
+            for rect in self.previous_dirty:
+                self.screen.blit(self.background, rect, rect)
+        self.dirty = []
+        
+    def mark(self, rect: Optional[pygame.Rect]):
+        if rect:
+            self.dirty.append(rect)
+            
+    def present(self):
+        if self.full_redraw or len(self.dirty) + len(self.previous_dirty) > self.max_dirty_rects:
+            pygame.display.flip()
+        else:
+            # The old positions must be pushed too, or moved sprites leave trails on screen.
+            pygame.display.update(self.previous_dirty + self.dirty)
+        self.previous_dirty = self.dirty
+        self.full_redraw = False
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 600.0, key_fields: Iterable[str] = ("backstory", "hp"),
+                 path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key_fields = tuple(key_fields)
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if self.path:
+            self.load()
+            
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        prompt = re.sub(r"[^\w\s']", " ", prompt.lower())
+        return " ".join(prompt.split())
+        
+    def make_key(self, villager_name: str, prompt: str, context_fields: dict) -> str:
+        relevant = [(name, context_fields.get(name)) for name in self.key_fields]
+        fields_hash = hashlib.sha1(repr(relevant).encode("utf-8")).hexdigest()[:16]
+        return f"{villager_name}|{self.normalize_prompt(prompt)}|{fields_hash}"
+        
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        response, created_at = entry
+        if self.ttl is not None and time.time() - created_at > self.ttl:
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return response
+        
+    def put(self, key: str, response: str):
+        self.entries[key] = (response, time.time())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            
+    def invalidate(self, villager_name: Optional[str] = None):
+        if villager_name is None:
+            self.entries.clear()
+            return
+        prefix = f"{villager_name}|"
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            del self.entries[key]
+            
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+        
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != 1 or not isinstance(data.get("entries", []), list):
+            return
+        now = time.time()
+        for entry in data.get("entries", []):
+            # A hand-edited or half-written file loses the bad rows, not the whole cache.
+            try:
+                key, response, created_at = entry
+                if not isinstance(key, str) or not isinstance(response, str):
+                    raise TypeError(key)
+                created_at = float(created_at)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if self.ttl is None or now - created_at <= self.ttl:
+                self.entries[key] = (response, created_at)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "version": 1,
+            "entries": [[key, response, created_at] for key, (response, created_at) in self.entries.items()]
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,492 @@
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from memory_store import InvertedIndex, MemoryStore
+
+MAGIC = b"VSAV"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<BHII")
+GAME, VILLAGER, MEMORY, MEMORY_APPEND, REMOVE = range(1, 6)
+
+DIRECTIONS = ["up", "down", "left", "right", "stop"]
+VILLAGER_STRUCT = struct.Struct("<10iBB")
+SPAWN_STRUCT = struct.Struct("<iii")
+GAME_STRUCT = struct.Struct("<iiiiIq")
+U32 = struct.Struct("<I")
+FOLLOWING, FLEEING, SEEKING_HELP, HAS_TARGET, ACTIVE, SPAWNED = (1 << i for i in range(6))
+
+GameState = namedtuple("GameState", "player_x player_y direction camera_x camera_y ticks seed spawned")
+VillagerState = namedtuple(
+    "VillagerState",
+    "x y start_x start_y hp max_hp speed move_timer move_direction following_player fleeing seeking_help "
+    "current_task target_pos name backstory spawn_key active"
+)
+
+def villager_key(villager) -> str:
+    if villager.spawn_key is not None:
+        (cx, cy), i = villager.spawn_key
+        return f"chunk:{cx}:{cy}:{i}"
+    return f"villager:{villager.name}"
+
+def villager_state(villager, active: bool = True) -> VillagerState:
+    return VillagerState(
+        villager.x, villager.y, villager.start_x, villager.start_y, villager.hp, villager.max_hp, villager.speed,
+        villager.move_timer, villager.move_direction, villager.following_player, villager.fleeing,
+        villager.seeking_help, villager.current_task, villager.target_pos, villager.name, villager.backstory,
+        villager.spawn_key, active
+    )
+
+def restore_villager(villager, state: VillagerState):
+    villager.x, villager.y = state.x, state.y
+    villager.start_x, villager.start_y = state.start_x, state.start_y
+    villager.hp = state.hp
+    villager.max_hp = state.max_hp
+    villager.speed = state.speed
+    villager.move_timer = state.move_timer
+    villager.move_direction = state.move_direction
+    villager.following_player = state.following_player
+    villager.fleeing = state.fleeing
+    villager.seeking_help = state.seeking_help
+    villager.current_task = state.current_task
+    villager.target_pos = state.target_pos
+    villager.route = None
+    villager.route_stuck_ticks = 0
+    villager.spawn_key = state.spawn_key
+    villager.sprite.place(state.x, state.y)
+
+def memory_mark(store: MemoryStore) -> tuple:
+    # Everything a background writer needs to copy a consistent prefix of a
+    # store the game thread keeps appending to.
+    return len(store), len(store.rollups), store.rolled_up_to
+
+def _array_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _load_array(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class Writer:
+    def __init__(self):
+        self.buffer = bytearray()
+        
+    def pack(self, fmt, *values):
+        if isinstance(fmt, struct.Struct):
+            self.buffer += fmt.pack(*values)
+        else:
+            self.buffer += struct.pack(fmt, *values)
+            
+    def blob(self, data):
+        self.buffer += U32.pack(len(data))
+        self.buffer += data
+        
+    def text(self, value: Optional[str]):
+        self.blob(value.encode("utf-8") if value else b"")
+        
+    def record(self, kind: int, key: str, payload: bytes):
+        key_data = key.encode("utf-8")
+        self.buffer += RECORD.pack(kind, len(key_data), len(payload), zlib.crc32(payload, zlib.crc32(key_data)))
+        self.buffer += key_data
+        self.buffer += payload
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+        
+    def unpack(self, fmt) -> tuple:
+        if not isinstance(fmt, struct.Struct):
+            fmt = struct.Struct(fmt)
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+        
+    def blob(self) -> memoryview:
+        (size,) = U32.unpack_from(self.data, self.offset)
+        start = self.offset + U32.size
+        data = self.data[start:start + size]
+        if len(data) != size:
+            raise ValueError("truncated field")
+        self.offset = start + size
+        return data
+        
+    def text(self) -> str:
+        return str(self.blob(), "utf-8")
+
+def pack_game(state: GameState) -> bytes:
+    out = Writer()
+    out.pack(GAME_STRUCT, state.player_x, state.player_y, state.camera_x, state.camera_y, state.ticks, state.seed)
+    out.text(state.direction)
+    out.pack(U32, len(state.spawned))
+    for (cx, cy), i in state.spawned:
+        out.pack(SPAWN_STRUCT, cx, cy, i)
+    return bytes(out.buffer)
+
+def unpack_game(data) -> GameState:
+    reader = Reader(data)
+    player_x, player_y, camera_x, camera_y, ticks, seed = reader.unpack(GAME_STRUCT)
+    direction = reader.text()
+    (count,) = reader.unpack(U32)
+    spawned = []
+    for _ in range(count):
+        cx, cy, i = reader.unpack(SPAWN_STRUCT)
+        spawned.append(((cx, cy), i))
+    return GameState(player_x, player_y, direction, camera_x, camera_y, ticks, seed, tuple(spawned))
+
+def pack_villager(state: VillagerState) -> bytes:
+    flags = (
+        FOLLOWING * state.following_player | FLEEING * state.fleeing | SEEKING_HELP * state.seeking_help
+        | HAS_TARGET * (state.target_pos is not None) | ACTIVE * state.active | SPAWNED * (state.spawn_key is not None)
+    )
+    target_x, target_y = state.target_pos or (0, 0)
+    out = Writer()
+    out.pack(
+        VILLAGER_STRUCT, state.x, state.y, state.start_x, state.start_y, state.hp, state.max_hp, state.speed,
+        state.move_timer, target_x, target_y, DIRECTIONS.index(state.move_direction), flags
+    )
+    if state.spawn_key is not None:
+        (cx, cy), i = state.spawn_key
+        out.pack(SPAWN_STRUCT, cx, cy, i)
+    out.text(state.name)
+    out.text(state.backstory)
+    out.text(state.current_task)
+    return bytes(out.buffer)
+
+def unpack_villager(data) -> VillagerState:
+    reader = Reader(data)
+    x, y, start_x, start_y, hp, max_hp, speed, move_timer, target_x, target_y, direction, flags = \
+        reader.unpack(VILLAGER_STRUCT)
+    spawn_key = None
+    if flags & SPAWNED:
+        cx, cy, i = reader.unpack(SPAWN_STRUCT)
+        spawn_key = ((cx, cy), i)
+    name = reader.text()
+    backstory = reader.text()
+    current_task = reader.text() or None
+    return VillagerState(
+        x, y, start_x, start_y, hp, max_hp, speed, move_timer, DIRECTIONS[direction], bool(flags & FOLLOWING),
+        bool(flags & FLEEING), bool(flags & SEEKING_HELP), current_task,
+        (target_x, target_y) if flags & HAS_TARGET else None, name, backstory, spawn_key, bool(flags & ACTIVE)
+    )
+
+def pack_index(out: Writer, index: InvertedIndex, docs: int):
+    # All terms go in one blob and all postings in one array, so loading is a
+    # few bulk copies instead of one small record per term.
+    out.blob(_array_bytes(index.lengths[:docs]))
+    packed = index.packed
+    if packed is not None:
+        # Never touched since it was loaded, so it can go back out as it came in.
+        terms, counts, postings = packed
+        out.text(terms)
+        out.blob(_array_bytes(counts))
+        out.blob(_array_bytes(postings))
+        return
+    # Postings are sorted document ids, so anything added after the mark is cut off the end.
+    terms = []
+    counts = array("I")
+    postings = array("I")
+    for term, docs_with_term in list(index.postings.items()):
+        cut = bisect_left(docs_with_term, docs)
+        if cut:
+            terms.append(term)
+            counts.append(cut)
+            postings += docs_with_term[:cut]
+    out.text("\n".join(terms))
+    out.blob(_array_bytes(counts))
+    out.blob(_array_bytes(postings))
+
+def unpack_index(reader: Reader, index: InvertedIndex):
+    index.lengths = _load_array("H", reader.blob())
+    index.total_length = sum(index.lengths)
+    index.postings = {}
+    index.packed = (reader.text(), _load_array("I", reader.blob()), _load_array("I", reader.blob()))
+
+def pack_memory(store: MemoryStore, mark: tuple) -> bytes:
+    # The raw text buffer, offsets and the BM25 index go to disk as they are,
+    # so loading is a handful of array copies rather than re-tokenizing.
+    count, rollups, rolled_up_to = mark
+    out = Writer()
+    out.pack("<II", count, rolled_up_to)
+    out.blob(bytes(store.data[:store.offsets[count]]))
+    out.blob(_array_bytes(store.offsets[:count + 1]))
+    out.blob(_array_bytes(store.times[:count]))
+    out.pack(U32, rollups)
+    for rollup in store.rollups[:rollups]:
+        out.text(rollup)
+    pack_index(out, store.index, count)
+    pack_index(out, store.rollup_index, rollups)
+    return bytes(out.buffer)
+
+def unpack_memory(data, store: MemoryStore) -> MemoryStore:
+    reader = Reader(data)
+    count, store.rolled_up_to = reader.unpack("<II")
+    store.data = bytearray(reader.blob())
+    store.offsets = _load_array("I", reader.blob())
+    store.times = _load_array("d", reader.blob())
+    (rollups,) = reader.unpack(U32)
+    store.rollups = [reader.text() for _ in range(rollups)]
+    unpack_index(reader, store.index)
+    unpack_index(reader, store.rollup_index)
+    if len(store.times) != count or len(store.offsets) != count + 1:
+        raise ValueError("inconsistent memory record")
+    return store
+
+def pack_memory_append(store: MemoryStore, start: int, end: int) -> bytes:
+    out = Writer()
+    out.pack("<II", start, end - start)
+    out.blob(_array_bytes(store.times[start:end]))
+    for i in range(start, end):
+        out.text(store.text(i))
+    return bytes(out.buffer)
+
+def apply_memory_append(data, store: MemoryStore):
+    reader = Reader(data)
+    start, count = reader.unpack("<II")
+    times = _load_array("d", reader.blob())
+    if start != len(store):
+        raise ValueError("memory append out of order")
+    for i in range(count):
+        # Replayed through add() so episode rollups come out exactly as they did in play.
+        store.add(reader.text(), times[i])
+
+class Snapshot:
+    def __init__(self):
+        self.game = None
+        self.villagers = {}
+        self.memories = {}
+        self.records = 0
+        self.complete = True
+
+def read_save(path: str, make_memory: Callable[[], MemoryStore] = MemoryStore) -> Optional[Snapshot]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+        
+    # Later records replace earlier ones for the same key, so the log is
+    # scanned first and only the surviving records are decoded. A torn write at
+    # the end (the game was killed mid-append) only loses that tail.
+    snapshot = Snapshot()
+    game = None
+    villagers = {}
+    memories = {}
+    view = memoryview(data)
+    offset = HEADER.size
+    while offset < len(data):
+        if offset + RECORD.size > len(data):
+            snapshot.complete = False
+            break
+        kind, key_size, size, checksum = RECORD.unpack_from(view, offset)
+        start = offset + RECORD.size
+        key_data = view[start:start + key_size]
+        payload = view[start + key_size:start + key_size + size]
+        if len(payload) != size or zlib.crc32(payload, zlib.crc32(key_data)) != checksum:
+            snapshot.complete = False
+            break
+        key = str(key_data, "utf-8")
+        if kind == GAME:
+            game = payload
+        elif kind == VILLAGER:
+            villagers[key] = payload
+        elif kind == MEMORY:
+            memories[key] = [payload]
+        elif kind == MEMORY_APPEND and key in memories:
+            memories[key].append(payload)
+        elif kind == REMOVE:
+            villagers.pop(key, None)
+            memories.pop(key, None)
+        snapshot.records += 1
+        offset = start + key_size + size
+    if game is None:
+        return None
+        
+    try:
+        snapshot.game = unpack_game(game)
+    except (ValueError, struct.error):
+        return None
+    for key, payload in villagers.items():
+        try:
+            snapshot.villagers[key] = unpack_villager(payload)
+        except (ValueError, IndexError, struct.error):
+            snapshot.complete = False
+    for key, (payload, *appends) in memories.items():
+        try:
+            store = unpack_memory(payload, make_memory())
+            for append in appends:
+                apply_memory_append(append, store)
+        except (ValueError, struct.error):
+            snapshot.complete = False
+            continue
+        snapshot.memories[key] = store
+    return snapshot
+
+class AutoSaver:
+    # The game thread only copies villager fields into tuples; packing,
+    # diffing and disk I/O happen on a background thread. Each save appends
+    # just the records that changed since the last one (plus new memory
+    # entries), and once that log outgrows the last full snapshot the file is
+    # rewritten from scratch and swapped in atomically.
+    def __init__(self, path: str, compact_ratio: float = 1.0, min_compact_bytes: int = 64 * 1024):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.min_compact_bytes = min_compact_bytes
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+        self.future = None
+        self.game_state = None
+        self.states = {}
+        self.marks = {}
+        self.base_bytes = 0
+        self.log_bytes = 0
+        self.needs_full = True
+        self.counters = {
+            "saves": 0,
+            "full_saves": 0,
+            "skipped": 0,
+            "errors": 0,
+            "records": 0,
+            "bytes_written": 0,
+            "last_save_ms": 0.0,
+            "load_ms": 0.0
+        }
+        
+    def load(self, make_memory: Callable[[], MemoryStore] = MemoryStore) -> Optional[Snapshot]:
+        started = time.perf_counter()
+        snapshot = read_save(self.path, make_memory)
+        self.counters["load_ms"] = (time.perf_counter() - started) * 1000
+        if snapshot is None:
+            return None
+        # What was just read is what is on disk, so the next save only has to write the differences.
+        self.game_state = snapshot.game
+        self.states = dict(snapshot.villagers)
+        self.marks = {key: (store, len(store)) for key, store in snapshot.memories.items()}
+        self.base_bytes = os.path.getsize(self.path)
+        self.log_bytes = 0
+        self.needs_full = not snapshot.complete
+        return snapshot
+        
+    @property
+    def busy(self) -> bool:
+        return self.future is not None and not self.future.done()
+        
+    def save(self, game_state: GameState, villagers: List[tuple], wait: bool = False) -> bool:
+        # `villagers` holds (key, VillagerState, MemoryStore, memory_mark) tuples.
+        if self.busy:
+            if not wait:
+                self.counters["skipped"] += 1
+                return False
+            self.future.exception()
+        self.future = self.executor.submit(self._write, game_state, villagers)
+        if wait:
+            self.future.exception()
+        return True
+        
+    def _write(self, game_state: GameState, villagers: List[tuple]):
+        started = time.perf_counter()
+        try:
+            compact = self.needs_full or self.log_bytes > max(self.min_compact_bytes,
+                                                              self.base_bytes * self.compact_ratio)
+            if compact:
+                written = self._write_full(game_state, villagers)
+            else:
+                written = self._append(game_state, villagers)
+        except Exception:
+            self.counters["errors"] += 1
+            self.needs_full = True
+            raise
+        self.counters["saves"] += 1
+        self.counters["bytes_written"] += written
+        self.counters["last_save_ms"] = (time.perf_counter() - started) * 1000
+        
+    def _write_full(self, game_state: GameState, villagers: List[tuple]) -> int:
+        out = Writer()
+        out.pack(HEADER, MAGIC, VERSION, 0)
+        out.record(GAME, "", pack_game(game_state))
+        states = {}
+        marks = {}
+        for key, state, store, mark in villagers:
+            out.record(VILLAGER, key, pack_villager(state))
+            states[key] = state
+            if store:
+                out.record(MEMORY, key, pack_memory(store, mark))
+                marks[key] = (store, mark[0])
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(out.buffer)
+        os.replace(tmp_path, self.path)
+        
+        self.game_state = game_state
+        self.states = states
+        self.marks = marks
+        self.base_bytes = len(out.buffer)
+        self.log_bytes = 0
+        self.needs_full = False
+        self.counters["full_saves"] += 1
+        self.counters["records"] += 1 + len(states) + len(marks)
+        return len(out.buffer)
+        
+    def _append(self, game_state: GameState, villagers: List[tuple]) -> int:
+        out = Writer()
+        records = 0
+        if game_state != self.game_state:
+            out.record(GAME, "", pack_game(game_state))
+            records += 1
+        states = {}
+        marks = {}
+        for key, state, store, mark in villagers:
+            states[key] = state
+            if state != self.states.get(key):
+                out.record(VILLAGER, key, pack_villager(state))
+                records += 1
+            if not store:
+                continue
+            marks[key] = (store, mark[0])
+            previous = self.marks.get(key)
+            if previous is None or previous[0] is not store or previous[1] > mark[0]:
+                out.record(MEMORY, key, pack_memory(store, mark))
+                records += 1
+            elif previous[1] < mark[0]:
+                out.record(MEMORY_APPEND, key, pack_memory_append(store, previous[1], mark[0]))
+                records += 1
+        for key in self.states.keys() - states.keys():
+            out.record(REMOVE, key, b"")
+            records += 1
+            
+        if out.buffer:
+            with open(self.path, "ab") as f:
+                f.write(out.buffer)
+        self.game_state = game_state
+        self.states = states
+        self.marks = marks
+        self.log_bytes += len(out.buffer)
+        self.counters["records"] += records
+        return len(out.buffer)
+        
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        stats["file_bytes"] = self.base_bytes + self.log_bytes
+        stats["busy"] = self.busy
+        return stats
+        
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,99 @@
+from typing import List, Tuple
+
+class TimerWheel:
+    # Hashed timing wheel: every entity has at most one pending wake-up, kept
+    # in the slot for `tick % slots`. Advancing one tick only looks at that
+    # slot, so per-tick cost follows how many entities wake up rather than
+    # how many are asleep. Wake-ups more than a lap ahead just sit in their
+    # slot until their lap comes round.
+    def __init__(self, slots: int = 256):
+        self.slots = [{} for _ in range(slots)]
+        self.when = {}
+        self.last = {}
+        self.now = 0
+        self.fired = 0
+        self.wakeups = 0
+        
+    def __len__(self) -> int:
+        return len(self.last)
+        
+    def __contains__(self, entity) -> bool:
+        return entity in self.last
+        
+    def add(self, entity, tick: int = 0):
+        # New entities wake on the next tick to find out what they are doing.
+        if entity not in self.last:
+            self.last[entity] = tick
+        self.schedule(entity, self.now + 1)
+        
+    def schedule(self, entity, tick: int):
+        # Replaces any pending wake-up; a tick that has already been processed means the next one.
+        if entity not in self.last:
+            return
+        when = self.when
+        if entity in when:
+            del self.slots[when[entity] % len(self.slots)][entity]
+        if tick <= self.now:
+            tick = self.now + 1
+        when[entity] = tick
+        self.slots[tick % len(self.slots)][entity] = tick
+        
+    def cancel(self, entity):
+        # The entity stays registered but sleeps until it is scheduled again.
+        tick = self.when.pop(entity, None)
+        if tick is not None:
+            del self.slots[tick % len(self.slots)][entity]
+            
+    def remove(self, entity):
+        if entity in self.last:
+            self.cancel(entity)
+            del self.last[entity]
+            
+    def reset(self, tick: int):
+        # After a jump (loading a save) nobody has time to catch up on, and
+        # everyone wakes next tick to find out what they are doing.
+        self.now = tick
+        for entity in self.last:
+            self.last[entity] = tick
+            self.schedule(entity, tick + 1)
+            
+    def scheduled_at(self, entity):
+        return self.when.get(entity)
+        
+    def due(self, tick: int) -> List[Tuple[object, int]]:
+        # Returns (entity, ticks since its last wake-up) for everything whose
+        # wake-up falls on or before `tick`, and unschedules them; whoever
+        # wants to run again has to ask.
+        count = len(self.slots)
+        ticks = range(self.now + 1, tick + 1)
+        if len(ticks) > count:
+            ticks = ticks[:count]
+        self.now = max(self.now, tick)
+        when = self.when
+        last = self.last
+        visits = []
+        for t in ticks:
+            slot = self.slots[t % count]
+            if not slot:
+                continue
+            ready = [entity for entity, at in slot.items() if at <= tick]
+            if len(ready) == len(slot):
+                slot.clear()
+            else:
+                for entity in ready:
+                    del slot[entity]
+            for entity in ready:
+                del when[entity]
+                visits.append((entity, tick - last[entity]))
+                last[entity] = tick
+        self.fired = len(visits)
+        self.wakeups += len(visits)
+        return visits
+        
+    def stats(self) -> dict:
+        return {
+            "entities": len(self.last),
+            "scheduled": len(self.when),
+            "due": self.fired,
+            "wakeups": self.wakeups
+        }
@@ -0,0 +1,242 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+UP, DOWN, LEFT, RIGHT, STOP = range(5)
+DIRECTION_NAMES = ["up", "down", "left", "right", "stop"]
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTION_NAMES)}
+
+TASK_NONE, TASK_GOTO, TASK_OTHER = range(3)
+
+class ObstacleMask:
+    # Integral image over the coordinate-compressed obstacle edges, so an
+    # overlap test for any number of rects is four lookups per rect and the
+    # memory cost depends on the obstacle count rather than the world size.
+    def __init__(self, rects):
+        rects = [tuple(rect) for rect in rects]
+        self.empty = not rects
+        if self.empty:
+            return
+        lefts = [r[0] for r in rects]
+        tops = [r[1] for r in rects]
+        rights = [r[0] + r[2] for r in rects]
+        bottoms = [r[1] + r[3] for r in rects]
+        self.xs = np.unique(np.array(lefts + rights, dtype=np.int64))
+        self.ys = np.unique(np.array(tops + bottoms, dtype=np.int64))
+        blocked = np.zeros((len(self.ys) - 1, len(self.xs) - 1), dtype=np.int32)
+        for left, top, right, bottom in zip(lefts, tops, rights, bottoms):
+            i0, i1 = np.searchsorted(self.xs, [left, right])
+            j0, j1 = np.searchsorted(self.ys, [top, bottom])
+            blocked[j0:j1, i0:i1] = 1
+        self.table = np.zeros((len(self.ys), len(self.xs)), dtype=np.int32)
+        self.table[1:, 1:] = blocked.cumsum(0).cumsum(1)
+        
+    def overlaps(self, x, y, w, h):
+        if self.empty:
+            return np.zeros(np.shape(x), dtype=bool)
+        nx = len(self.xs) - 1
+        ny = len(self.ys) - 1
+        i0 = np.clip(np.searchsorted(self.xs, x, "right") - 1, 0, nx)
+        i1 = np.clip(np.searchsorted(self.xs, x + w, "left"), 0, nx)
+        j0 = np.clip(np.searchsorted(self.ys, y, "right") - 1, 0, ny)
+        j1 = np.clip(np.searchsorted(self.ys, y + h, "left"), 0, ny)
+        i1 = np.maximum(i0, i1)
+        j1 = np.maximum(j0, j1)
+        t = self.table
+        return (t[j1, i1] - t[j0, i1] - t[j1, i0] + t[j0, i0]) > 0
+
+class NumpyVillagerSim:
+    def __init__(self, villagers, obstacles, bounds, seed=None, stuck_ticks: int = 60):
+        if np is None:
+            raise RuntimeError("The numpy simulation backend requires numpy (pip install numpy)")
+        self.villagers = list(villagers)
+        self.bounds = bounds
+        self.stuck_ticks = stuck_ticks
+        self.rng = np.random.default_rng(seed)
+        self.index_of = {id(villager): i for i, villager in enumerate(self.villagers)}
+        self.dx_table = np.array([0, 0, -1, 1, 0], dtype=np.int32)
+        self.dy_table = np.array([-1, 1, 0, 0, 0], dtype=np.int32)
+        self.events = []
+        
+        n = len(self.villagers)
+        self.x = np.zeros(n, dtype=np.int32)
+        self.y = np.zeros(n, dtype=np.int32)
+        self.width = np.zeros(n, dtype=np.int32)
+        self.height = np.zeros(n, dtype=np.int32)
+        self.speed = np.zeros(n, dtype=np.int32)
+        self.hp = np.zeros(n, dtype=np.int32)
+        self.fleeing = np.zeros(n, dtype=bool)
+        self.seeking_help = np.zeros(n, dtype=bool)
+        self.following = np.zeros(n, dtype=bool)
+        self.task = np.zeros(n, dtype=np.int8)
+        self.target_x = np.zeros(n, dtype=np.int32)
+        self.target_y = np.zeros(n, dtype=np.int32)
+        self.routed = np.zeros(n, dtype=bool)
+        self.stuck = np.zeros(n, dtype=np.int32)
+        self.move_timer = np.zeros(n, dtype=np.int32)
+        self.move_direction = np.zeros(n, dtype=np.int8)
+        for villager in self.villagers:
+            self.pull(villager)
+        self.set_obstacles(obstacles)
+        
+    def set_obstacles(self, obstacles):
+        self.obstacles = ObstacleMask(obstacles)
+        
+    def pull(self, villager):
+        i = self.index_of[id(villager)]
+        self.x[i] = villager.x
+        self.y[i] = villager.y
+        self.width[i] = villager.width
+        self.height[i] = villager.height
+        self.speed[i] = villager.speed
+        self.hp[i] = villager.hp
+        self.fleeing[i] = villager.fleeing
+        self.seeking_help[i] = villager.seeking_help
+        self.following[i] = villager.following_player
+        self.move_timer[i] = villager.move_timer
+        self.move_direction[i] = DIRECTION_CODES[villager.move_direction]
+        self.routed[i] = False
+        if not villager.current_task:
+            self.task[i] = TASK_NONE
+        elif "go to" in villager.current_task.lower() and villager.target_pos:
+            self.task[i] = TASK_GOTO
+            self.target_x[i], self.target_y[i] = villager.target_pos
+            self.routed[i] = villager.route is not None
+            self.stuck[i] = villager.route_stuck_ticks
+        else:
+            self.task[i] = TASK_OTHER
+            
+    def write_back(self):
+        for villager, x, y, fleeing, seeking_help, timer, direction in zip(
+                self.villagers, self.x.tolist(), self.y.tolist(), self.fleeing.tolist(),
+                self.seeking_help.tolist(), self.move_timer.tolist(), self.move_direction.tolist()):
+            villager.x = x
+            villager.y = y
+            villager.fleeing = fleeing
+            villager.seeking_help = seeking_help
+            villager.move_timer = timer
+            villager.move_direction = DIRECTION_NAMES[direction]
+            villager.sprite.update_position(x, y)
+            
+    def step(self, player):
+        width, height = self.bounds
+        self.move_timer += 1
+        alive = self.hp > 0
+        
+        flee = alive & self.fleeing
+        follow = alive & ~self.fleeing & self.following
+        tasked = alive & ~self.fleeing & ~self.following & (self.task != TASK_NONE)
+        goto = tasked & (self.task == TASK_GOTO)
+        wander = alive & ~self.fleeing & ~self.following & (self.task == TASK_NONE)
+        arrived = np.zeros_like(goto)
+        abandoned = np.zeros_like(goto)
+        
+        # Routed go-to villagers steer at their route's next waypoint (the
+        # target itself is the middle of a house) and arrive on its goal cells.
+        # There are only ever a handful, so the routes are asked one by one.
+        for i in np.flatnonzero(goto & self.routed).tolist():
+            route = self.villagers[i].route
+            x, y = int(self.x[i]), int(self.y[i])
+            if route.arrived(x, y):
+                arrived[i] = True
+                continue
+            waypoint = route.next_waypoint(x, y)
+            if waypoint is None:
+                abandoned[i] = True
+            else:
+                self.target_x[i], self.target_y[i] = waypoint
+        new_x = self.x.copy()
+        new_y = self.y.copy()
+        
+        # Random walk: pick a new heading every 120 ticks, then step along it.
+        turn = wander & (self.move_timer > 120)
+        self.move_timer[turn] = 0
+        self.move_direction[turn] = self.rng.integers(0, 5, int(turn.sum()))
+        walking = wander & (self.move_direction != STOP)
+        new_x += np.where(walking, self.dx_table[self.move_direction] * self.speed, 0)
+        new_y += np.where(walking, self.dy_table[self.move_direction] * self.speed, 0)
+        
+        # Follow, flee and go-to all step along the dominant axis toward (or away from) a target.
+        dx = np.where(goto, self.target_x, player.x) - self.x
+        dy = np.where(goto, self.target_y, player.y) - self.y
+        distance = np.sqrt(dx.astype(np.float64) ** 2 + dy.astype(np.float64) ** 2)
+        horizontal = np.abs(dx) > np.abs(dy)
+        toward_x = np.where(dx > 0, 1, -1)
+        toward_y = np.where(dy > 0, 1, -1)
+        
+        chasing = follow & (distance > 50)
+        new_x += np.where(chasing & horizontal, toward_x * self.speed, 0)
+        new_y += np.where(chasing & ~horizontal, toward_y * self.speed, 0)
+        
+        running = flee & (distance < 200)
+        self.fleeing[flee & ~running] = False
+        new_x += np.where(running & horizontal, -toward_x * self.speed * 2, 0)
+        new_y += np.where(running & ~horizontal, -toward_y * self.speed * 2, 0)
+        new_x = np.where(running, np.clip(new_x, 0, width - self.width), new_x)
+        new_y = np.where(running, np.clip(new_y, 0, height - self.height), new_y)
+        
+        arrived |= goto & ~self.routed & (distance < 20)
+        self.task[arrived] = TASK_NONE
+        for i in np.flatnonzero(arrived).tolist():
+            self.events.append((i, "Arrived at destination"))
+        travelling = goto & ~arrived & ~abandoned
+        # Steps are clamped so villagers land on waypoints instead of overshooting them.
+        step = self.speed * 2
+        new_x += np.where(travelling & horizontal, np.clip(dx, -step, step), 0)
+        new_y += np.where(travelling & ~horizontal, np.clip(dy, -step, step), 0)
+        
+        # Collision revert; wanderers also bounce off the screen edges and pick a new heading.
+        moved = walking | chasing | running | travelling
+        blocked = moved & self.obstacles.overlaps(new_x, new_y, self.width, self.height)
+        out_of_bounds = (new_x < 0) | (new_x > width - self.width) | (new_y < 0) | (new_y > height - self.height)
+        bounced = walking & out_of_bounds
+        revert = blocked | bounced
+        self.x = np.where(revert, self.x, new_x).astype(np.int32)
+        self.y = np.where(revert, self.y, new_y).astype(np.int32)
+        redirect = walking & revert
+        self.move_direction[redirect] = self.rng.integers(0, 4, int(redirect.sum()))
+        
+        # Go-to villagers who stay blocked give up, like the python backend.
+        self.stuck = np.where(travelling, np.where(blocked, self.stuck + 1, 0), self.stuck)
+        abandoned |= travelling & (self.stuck > self.stuck_ticks)
+        self.task[abandoned] = TASK_NONE
+        self.stuck[abandoned] = 0
+        for i in np.flatnonzero(abandoned).tolist():
+            self.events.append((i, "Couldn't find a way to my destination"))
+            
+        self._apply_events()
+        
+    def _apply_events(self):
+        if not self.events:
+            return
+        for i, memory in self.events:
+            villager = self.villagers[i]
+            if memory == "Arrived at destination":
+                villager.current_task = None
+                villager.target_pos = None
+                villager.route = None
+            elif memory == "Couldn't find a way to my destination":
+                villager._abandon_route()
+                continue
+            villager.add_memory(memory)
+        self.events = []
+        
+    def _overlapping(self, rect):
+        left, top, w, h = rect
+        return (self.x < left + w) & (self.x + self.width > left) & (self.y < top + h) & (self.y + self.height > top)
+        
+    def villagers_in_rect(self, rect):
+        return [self.villagers[i] for i in np.flatnonzero(self._overlapping(rect)).tolist()]
+        
+    def villager_in_rect(self, rect, origin, exclude=None):
+        hit = (self.hp > 0) & self._overlapping(rect)
+        if exclude is not None:
+            hit[self.index_of[id(exclude)]] = False
+        candidates = np.flatnonzero(hit)
+        if not len(candidates):
+            return None
+        cx = self.x[candidates] + self.width[candidates] / 2
+        cy = self.y[candidates] + self.height[candidates] / 2
+        nearest = np.argmin((cx - origin[0]) ** 2 + (cy - origin[1]) ** 2)
+        return self.villagers[candidates[nearest]]
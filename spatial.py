@@ -0,0 +1,103 @@
+from typing import Callable, List, Optional, Tuple
+
+import pygame
+
+class SpatialHash:
+    def __init__(self, cell_size: int = 64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}
+        
+    def __len__(self):
+        return len(self.entries)
+        
+    def __contains__(self, item):
+        return id(item) in self.entries
+        
+    def _cells_for(self, rect) -> List[Tuple[int, int]]:
+        size = self.cell_size
+        x0 = rect.left // size
+        y0 = rect.top // size
+        x1 = max(x0, (rect.right - 1) // size)
+        y1 = max(y0, (rect.bottom - 1) // size)
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+        
+    def insert(self, item, rect=None):
+        key = id(item)
+        if key in self.entries:
+            self.remove(item)
+        rect = pygame.Rect(item if rect is None else rect)
+        cells = self._cells_for(rect)
+        self.entries[key] = (item, rect, cells)
+        for cell in cells:
+            self.cells.setdefault(cell, {})[key] = item
+            
+    def remove(self, item):
+        entry = self.entries.pop(id(item), None)
+        if entry is None:
+            return
+        for cell in entry[2]:
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.pop(id(item), None)
+                if not bucket:
+                    del self.cells[cell]
+                    
+    def update(self, item, rect):
+        entry = self.entries.get(id(item))
+        if entry is None:
+            self.insert(item, rect)
+            return
+        stored = entry[1]
+        if stored.topleft == (rect[0], rect[1]) and stored.size == (rect[2], rect[3]):
+            return
+        cells = self._cells_for(pygame.Rect(rect))
+        if cells == entry[2]:
+            # Still in the same cells, so only the stored bounds need refreshing.
+            stored.update(rect)
+            return
+        self.insert(item, rect)
+        
+    def query(self, rect) -> list:
+        rect = pygame.Rect(rect)
+        found = []
+        seen = set()
+        for cell in self._cells_for(rect):
+            bucket = self.cells.get(cell)
+            if not bucket:
+                continue
+            for key, item in bucket.items():
+                if key in seen:
+                    continue
+                seen.add(key)
+                if self.entries[key][1].colliderect(rect):
+                    found.append(item)
+        return found
+        
+    def collides(self, rect, ignore=None) -> bool:
+        rect = pygame.Rect(rect)
+        for cell in self._cells_for(rect):
+            bucket = self.cells.get(cell)
+            if not bucket:
+                continue
+            for key, item in bucket.items():
+                if item is not ignore and self.entries[key][1].colliderect(rect):
+                    return True
+        return False
+        
+    def nearest(self, rect, origin: Tuple[float, float], predicate: Optional[Callable] = None):
+        best = None
+        best_distance = None
+        for item in self.query(rect):
+            if predicate and not predicate(item):
+                continue
+            cx, cy = self.entries[id(item)][1].center
+            distance = (cx - origin[0]) ** 2 + (cy - origin[1]) ** 2
+            if best_distance is None or distance < best_distance:
+                best = item
+                best_distance = distance
+        return best
+        
+    def rect_of(self, item):
+        entry = self.entries.get(id(item))
+        return entry[1] if entry else None
@@ -0,0 +1,141 @@
+import random
+from collections import defaultdict
+from typing import Callable, List, Optional, Tuple
+
+import pygame
+
+class Camera:
+    def __init__(self, width: int, height: int, world_width: int, world_height: int, deadzone: float = 0.25):
+        self.width = width
+        self.height = height
+        self.world_width = world_width
+        self.world_height = world_height
+        self.deadzone = deadzone
+        self.x = 0
+        self.y = 0
+        
+    @property
+    def offset(self) -> Tuple[int, int]:
+        return self.x, self.y
+        
+    @property
+    def rect(self) -> pygame.Rect:
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+        
+    def follow(self, x: int, y: int, width: int, height: int) -> bool:
+        # The camera only scrolls once the target leaves the middle of the view,
+        # so while the player potters about the background stays put and the
+        # renderer can keep using dirty rects.
+        margin_x = int(self.width * self.deadzone)
+        margin_y = int(self.height * self.deadzone)
+        new_x, new_y = self.x, self.y
+        if x < new_x + margin_x:
+            new_x = x - margin_x
+        elif x + width > new_x + self.width - margin_x:
+            new_x = x + width - self.width + margin_x
+        if y < new_y + margin_y:
+            new_y = y - margin_y
+        elif y + height > new_y + self.height - margin_y:
+            new_y = y + height - self.height + margin_y
+        new_x = max(0, min(self.world_width - self.width, new_x))
+        new_y = max(0, min(self.world_height - self.height, new_y))
+        moved = (new_x, new_y) != (self.x, self.y)
+        self.x, self.y = new_x, new_y
+        return moved
+        
+    def to_screen(self, rect) -> pygame.Rect:
+        return pygame.Rect(rect).move(-self.x, -self.y)
+
+class Chunk:
+    def __init__(self, key: Tuple[int, int], rect: pygame.Rect):
+        self.key = key
+        self.rect = rect
+        self.props = []
+        self.surface = None
+
+class World:
+    # Splits the map into square chunks that are only materialised near the
+    # camera. Chunk content comes from a seeded generator, so a chunk that is
+    # unloaded and loaded again looks the same, and villagers who have
+    # something to remember are parked with their chunk instead of discarded.
+    def __init__(self, width: int, height: int, chunk_size: int = 512, seed: int = 0,
+                 generate: Optional[Callable] = None, load_margin: int = 1, unload_margin: int = 2):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.cols = (width + chunk_size - 1) // chunk_size
+        self.rows = (height + chunk_size - 1) // chunk_size
+        self.seed = seed
+        self.generate = generate
+        self.load_margin = load_margin
+        self.unload_margin = unload_margin
+        self.chunks = {}
+        self.dormant = defaultdict(list)
+        self.spawned = set()
+        
+    def key_at(self, x: int, y: int) -> Tuple[int, int]:
+        return (
+            min(self.cols - 1, max(0, x // self.chunk_size)),
+            min(self.rows - 1, max(0, y // self.chunk_size))
+        )
+        
+    def chunk_rect(self, key: Tuple[int, int]) -> pygame.Rect:
+        size = self.chunk_size
+        return pygame.Rect(key[0] * size, key[1] * size, size, size)
+        
+    def keys_in(self, rect, margin: int = 0) -> List[Tuple[int, int]]:
+        rect = pygame.Rect(rect)
+        col0, row0 = self.key_at(rect.left, rect.top)
+        col1, row1 = self.key_at(rect.right - 1, rect.bottom - 1)
+        return [
+            (col, row)
+            for row in range(max(0, row0 - margin), min(self.rows - 1, row1 + margin) + 1)
+            for col in range(max(0, col0 - margin), min(self.cols - 1, col1 + margin) + 1)
+        ]
+        
+    def missing(self, view) -> List[Tuple[int, int]]:
+        return [key for key in self.keys_in(view, self.load_margin) if key not in self.chunks]
+        
+    def stale(self, view) -> List[Tuple[int, int]]:
+        # Loading and unloading use different margins so walking back and forth
+        # across a chunk border does not thrash.
+        keep = set(self.keys_in(view, self.unload_margin))
+        return [key for key in self.chunks if key not in keep]
+        
+    def load(self, key: Tuple[int, int]):
+        chunk = Chunk(key, self.chunk_rect(key))
+        villagers = self.dormant.pop(key, [])
+        if self.generate:
+            rng = random.Random(f"{self.seed}:{key[0]}:{key[1]}")
+            props, spawns = self.generate(key, chunk.rect, rng)
+            chunk.props = props
+            for spawn_key, make_villager in spawns:
+                if spawn_key not in self.spawned:
+                    villager = make_villager()
+                    villager.spawn_key = spawn_key
+                    self.spawned.add(spawn_key)
+                    villagers.append(villager)
+        self.chunks[key] = chunk
+        return chunk, villagers
+        
+    def unload(self, key: Tuple[int, int]) -> Chunk:
+        return self.chunks.pop(key)
+        
+    def park(self, villager, keep: bool):
+        # Villagers the generator can recreate exactly are simply forgotten.
+        if not keep and villager.spawn_key is not None:
+            self.spawned.discard(villager.spawn_key)
+            return
+        self.dormant[self.key_at(villager.x, villager.y)].append(villager)
+        
+    def is_loaded(self, x: int, y: int) -> bool:
+        return self.key_at(x, y) in self.chunks
+        
+    def stats(self) -> dict:
+        return {
+            "loaded_chunks": len(self.chunks),
+            "total_chunks": self.cols * self.rows,
+            "dormant_villagers": sum(len(villagers) for villagers in self.dormant.values()),
+            "spawned_villagers": len(self.spawned),
+            "props": sum(len(chunk.props) for chunk in self.chunks.values())
+        }